@@ -0,0 +1,3 @@
+"""
+Statistical analysis of the cleaned dataset.
+"""
@@ -1,151 +1,543 @@
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-from scipy.stats import mannwhitneyu, rankdata
-
-# Load cleaned dataset
-df = pd.read_csv("Statistics/Cleaned_DatasetBio.csv", delimiter=";")
-
-# Ensure Trip_Number is treated as an integer
-df["Trip_Number"] = df["Trip_Number"].astype(int)
-
-# Extract Sample_Type from Sample_Name
-df["Sample_Type"] = df["Sample_Name"].str.extract(r'(\d{2,3})')[0]
-df = df.dropna(subset=["Sample_Type"])  # Remove NaN rows
-df["Sample_Type"] = df["Sample_Type"].astype(int)
-
-# Identify control and hormone-treated samples
-df["Control"] = df["Sample_Name"].str.startswith("K")  # Control samples start with "K"
-
-# Get hormone columns explicitly (only columns that are numeric and not Trip_Number or Sample_Type)
-hormone_columns = df.select_dtypes(include=["float64", "int64"]).columns.tolist()
-hormone_columns = [col for col in hormone_columns if col not in ["Trip_Number", "Sample_Type"]]  # Exclude non-hormone columns
+import argparse
+import math
+import os
+import sys
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.dataset import load_dataset, get_hormone_columns, file_hash, cleaned_csv
+from Main.Common.group_index import GroupIndex, load_group_index
+from Main.Common.rank_stats import (rank_partitions, group_sums, mann_whitney_u, mann_whitney_asymptotic_p,
+                                    cliffs_delta_from_u, kruskal_wallis)
+from Main.Common.resampling import resample_pairs, default_resamples
+from Main.Common.results_store import save_results_store
+from Main.Common.sharding import parse_shard, shard_cells, write_shard, default_shard_dir
+from Main.Common.instrumentation import traced, add_trace_argument, enable_from_args
+from Main.Common.incremental import group_fingerprints, load_group_store, save_group_store, changed_groups, reusable_rows
+
+# Exact Mann-Whitney null distributions, reused across runs
+null_table_file = "Statistics/Cache/mwu_exact_null.npz"
+exact_null_tables = {}
+
+# Function to load previously computed null distributions from disk
+def load_null_tables(path=null_table_file):
+    """
+    Fills exact_null_tables from the .npz file written by save_null_tables, if it exists.
+    Keys are stored as "nx_ny" with nx <= ny.
+    """
+    if not os.path.exists(path):
+        return
+    with np.load(path) as stored:
+        for key in stored.files:
+            nx, ny = (int(n) for n in key.split("_"))
+            exact_null_tables[(nx, ny)] = stored[key]
+
+# Function to persist the null distributions for the next run
+def save_null_tables(path=null_table_file):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written to a temporary file first, so processes saving at the same time never leave a partial file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **{f"{nx}_{ny}": table for (nx, ny), table in exact_null_tables.items()})
+    os.replace(temporary, path)
+
+# Function to build (or fetch) the exact null distribution of U for two sample sizes
+@traced
+def exact_null_cdf(nx, ny):
+    """
+    Returns P(U <= u) for u = 0 .. nx*ny under the null hypothesis, for samples without ties.
+    Frequencies follow f(a, b, u) = f(a, b-1, u) + f(a-1, b, u-b), built up one y at a time.
+    """
+    key = (min(nx, ny), max(nx, ny))
+    if key not in exact_null_tables:
+        small, large = key
+        counts = [np.ones(1) for _ in range(small + 1)]  # b = 0: a single arrangement with U = 0
+        for b in range(1, large + 1):
+            for a in range(1, small + 1):
+                updated = np.zeros(a * b + 1)
+                updated[:len(counts[a])] += counts[a]
+                updated[b:] += counts[a - 1]
+                counts[a] = updated
+        exact_null_tables[key] = np.cumsum(counts[small] / math.comb(small + large, small))
+    return exact_null_tables[key]
+
+# Function to turn observed U statistics into exact two-sided p-values with a table lookup
+def exact_p_values(u_stats, nx, ny):
+    """
+    Same result as mannwhitneyu(..., method="exact", alternative="two-sided") for untied samples.
+    """
+    u_stats = np.asarray(u_stats, dtype=float)
+    u_larger = np.maximum(u_stats, nx * ny - u_stats)
+    # P(U >= u) equals P(U <= nx*ny - u) by symmetry
+    cdf = exact_null_cdf(nx, ny)
+    return np.clip(2 * cdf[(nx * ny - u_larger).astype(int)], 0, 1)
+
+# Function to round effect sizes and categorize them
+def categorize_effect(delta):
+    delta = np.round(delta, 4)
+    magnitude = np.abs(delta)
+    category = np.select([magnitude < 0.147, magnitude < 0.33], ["Small", "Medium"], "Large").astype(object)
+    category[np.isnan(delta)] = "Manual Review Needed"  # One of the samples is empty
+    return delta, category
+
+# Function to compute Cliff's Delta for many (control, treated) pairs at once
+@traced
+def cliffs_delta_batch(x, y):
+    """
+    Computes Cliff's Delta effect size and its category for a stack of group pairs.
+    x and y are (pairs x samples) arrays padded with NaN; row i of x is compared with row i of y.
+    The dominance count is taken from the rank sum of x in the combined sample, so each pair
+    costs one sort instead of an nx * ny comparison matrix.
+    Returns arrays of effect sizes and categorical interpretations.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    nx = (~np.isnan(x)).sum(axis=1)
+    ny = (~np.isnan(y)).sum(axis=1)
 
-# Set seaborn style
-sns.set_style("whitegrid")
+    # One column per pair, ranked as a single group
+    combined = np.concatenate((x, y), axis=1).T
+    (ranks, _, _), = rank_partitions(combined, np.zeros(len(combined), dtype=np.int64))
+    u_x = mann_whitney_u(np.nansum(ranks[:x.shape[1]], axis=0), nx)
+    return categorize_effect(cliffs_delta_from_u(u_x, nx, ny))
 
 # Function to compute Cliff's Delta for effect size
+@traced
 def cliffs_delta(x, y):
     """
     Computes Cliff's Delta effect size and categorizes it.
     Returns effect size and its categorical interpretation.
     """
-    x, y = np.array(x), np.array(y)
-    nx, ny = len(x), len(y)
-
-    if nx == 0 or ny == 0:
-        return np.nan, "Manual Review Needed"
-
-    combined = np.concatenate((x, y))  
-    ranks = rankdata(combined)  
+    delta, category = cliffs_delta_batch(np.array(x, dtype=float).reshape(1, -1),
+                                         np.array(y, dtype=float).reshape(1, -1))
+    return delta[0], category[0]
 
-    rx, ry = ranks[:nx], ranks[nx:]
-
-    num_greater = np.sum(rx[:, None] > ry)
-    num_lesser = np.sum(rx[:, None] < ry)
-
-    delta = (num_greater - num_lesser) / (nx * ny)
+# Function to pick the Mann-Whitney method scipy would use
+def exact_method(nx, ny, tie_terms):
+    """
+    Mirrors scipy's method="auto": exact p-values for small samples without ties,
+    the normal approximation otherwise.
+    """
+    return ~((nx > 8) & (ny > 8)) & (tie_terms == 0)
 
-    # Categorize effect size
-    if abs(delta) < 0.147:
-        category = "Small"
-    elif abs(delta) < 0.33:
-        category = "Medium"
-    else:
-        category = "Large"
+# Function to compute two-sided Mann-Whitney p-values from U
+def mann_whitney_p_values(u_x, nx, ny, tie_terms):
+    """
+    Exact p-values come from the cached null distributions, one lookup per pair of sample
+    sizes; the rest use the normal approximation. Takes arrays of equal shape.
+    """
+    p_values = mann_whitney_asymptotic_p(u_x, nx, ny, tie_terms)
+    exact = exact_method(nx, ny, tie_terms)
+    for size_x, size_y in set(zip(nx[exact], ny[exact])):
+        same_sizes = exact & (nx == size_x) & (ny == size_y)
+        p_values[same_sizes] = exact_p_values(u_x[same_sizes], int(size_x), int(size_y))
+    return p_values
+
+class SampleTypeRanks:
+    """
+    The rows of one sample type ranked once per hormone, from a single sort: within every
+    trip (for the Mann-Whitney U test and Cliff's Delta) and within the control and the
+    treated rows across trips (for the Kruskal-Wallis test).
+    Per (Trip_Number, Control) group it keeps the number of values and both rank sums
+    (groups x hormones), and the tie terms per trip and per side.
+    """
 
-    return round(delta, 4), category
+    def __init__(self, index, sample_type):
+        rows, keys, group_of_row = index.sample_type_block(sample_type)
+        self.n_hormones = rows.shape[1]
+        self.positions = {(trip, control): i for i, (_, trip, control) in enumerate(keys)}
+        self.trips = sorted({trip for _, trip, _ in keys})
+        trip_of_group = np.array([self.trips.index(trip) for _, trip, _ in keys], dtype=np.int64)
+        side_of_group = np.array([0 if control else 1 for _, _, control in keys], dtype=np.int64)
+
+        (trip_ranks, _, self.trip_ties), (side_ranks, _, self.side_ties) = rank_partitions(
+            rows, trip_of_group[group_of_row], side_of_group[group_of_row])
+        self.counts = group_sums(~np.isnan(rows), group_of_row, len(keys)).astype(np.int64)
+        self.trip_rank_sums = group_sums(trip_ranks, group_of_row, len(keys))
+        self.side_rank_sums = group_sums(side_ranks, group_of_row, len(keys))
+
+    # Function to get the Mann-Whitney inputs of one trip: sizes, rank sum of the controls and tie terms
+    def trip_inputs(self, trip):
+        control = self.positions.get((trip, True))
+        treated = self.positions.get((trip, False))
+        no_values = np.zeros(self.n_hormones, dtype=np.int64)
+        control_n = no_values if control is None else self.counts[control]
+        treated_n = no_values if treated is None else self.counts[treated]
+        rank_sum = no_values if control is None else self.trip_rank_sums[control]
+        ties = self.trip_ties[self.trips.index(trip)] if trip in self.trips else no_values
+        return control_n, treated_n, rank_sum, ties
+
+    # Function to test one side (control or treated) across trips
+    def kruskal_wallis(self, control):
+        groups = [i for (_, is_control), i in sorted(self.positions.items()) if is_control == control]
+        if not groups:
+            nothing = np.full(self.n_hormones, np.nan)
+            return np.zeros(self.n_hormones, dtype=np.int64), np.zeros(self.n_hormones, dtype=np.int64), nothing, nothing
+        counts = self.counts[groups]
+        h, dof, p_values = kruskal_wallis(self.side_rank_sums[groups], counts, self.side_ties[0 if control else 1])
+        return (counts > 0).sum(axis=0), counts.sum(axis=0), h, p_values
+
+# Function to rank a sample type once, reusing an earlier ranking when there is one
+def ranked_sample_type(ranked, index, sample_type):
+    if sample_type not in ranked:
+        ranked[sample_type] = SampleTypeRanks(index, sample_type)
+    return ranked[sample_type]
+
+results_columns = ["Trip", "Sample Type", "Hormone", "Control N", "Treated N", "p-value",
+                   "Effect Size", "Effect Category", "Conclusion", "Causation"]
 
 # Function to perform Mann-Whitney U test trip by trip
-def perform_statistical_analysis(df):
+@traced
+def perform_statistical_analysis(df, groups=None, index=None, ranked=None):
     """
     Performs Mann-Whitney U test for each trip, comparing Control vs. Hormone-Treated samples
     for each sample type and hormone.
+    Each sample type's rows are read as one view of the GroupIndex and ranked once per hormone
+    (see SampleTypeRanks); U, the p-values and Cliff's Delta of all groups and hormones are then
+    computed together from the rank sums.
+    groups optionally restricts the run to a list of (Sample_Type, Trip_Number) pairs; index is
+    a GroupIndex of df, built here when not given; ranked is a dict of SampleTypeRanks by sample
+    type that is filled here and can be passed on to perform_kruskal_wallis.
     Returns a single consolidated results table.
     """
-    results = []
-
-    for hormone in hormone_columns:
-        for sample_type in df["Sample_Type"].unique():
-            for trip in df["Trip_Number"].unique():
-                control_values = df[(df["Trip_Number"] == trip) & (df["Control"]) & (df["Sample_Type"] == sample_type)][hormone].dropna()
-                treated_values = df[(df["Trip_Number"] == trip) & (~df["Control"]) & (df["Sample_Type"] == sample_type)][hormone].dropna()
-
-                if len(control_values) < 2 or len(treated_values) < 2:
-                    results.append([trip, sample_type, hormone, len(control_values), len(treated_values), "N/A", "N/A", "N/A", "Too few samples", "Manual Review Needed"])
-                    continue
-
-                # Perform Mann-Whitney U test
-                stat, p_value = mannwhitneyu(control_values, treated_values, alternative='two-sided')
-
-                # Compute Cliff’s Delta effect size
-                effect_size, effect_category = cliffs_delta(control_values, treated_values)
-
-                # Interpretation
-                if p_value < 0.05:
-                    conclusion = "Significant Difference"
-                    causation = "Likely Not Random"
-                else:
-                    conclusion = "No Significant Difference"
-                    causation = "Possibly Random or Insufficient Data"
-
-                # Store results
-                results.append([
-                    trip, sample_type, hormone, len(control_values), len(treated_values),
-                    round(p_value, 4), effect_size, effect_category, conclusion, causation
-                ])
-
-    # Convert results to DataFrame
-    results_df = pd.DataFrame(results, columns=[
-        "Trip", "Sample Type", "Hormone", "Control N", "Treated N", "p-value", 
-        "Effect Size", "Effect Category", "Conclusion", "Causation"
-    ])
-    
+    hormone_columns = get_hormone_columns(df)
+    if index is None:
+        index = GroupIndex.from_dataset(df)
+    ranked = {} if ranked is None else ranked
+
+    if groups is None:
+        groups = [(sample_type, trip) for sample_type in df["Sample_Type"].unique() for trip in df["Trip_Number"].unique()]
+    if not groups:
+        return pd.DataFrame(columns=results_columns)
+
+    # Sizes, control rank sums and tie terms as (groups x hormones) arrays
+    inputs = [ranked_sample_type(ranked, index, sample_type).trip_inputs(trip) for sample_type, trip in groups]
+    control_n, treated_n, rank_sum, ties = (np.array(part) for part in zip(*inputs))
+    testable = (control_n >= 2) & (treated_n >= 2)
+
+    u_x = mann_whitney_u(rank_sum, control_n)
+    p_values = np.full(u_x.shape, np.nan)
+    p_values[testable] = mann_whitney_p_values(u_x[testable], control_n[testable], treated_n[testable], ties[testable])
+    effect_sizes, effect_categories = categorize_effect(cliffs_delta_from_u(u_x, control_n, treated_n))
+
+    n_hormones = len(hormone_columns)
+    results_df = pd.DataFrame({
+        "Trip": np.repeat([trip for _, trip in groups], n_hormones),
+        "Sample Type": np.repeat([sample_type for sample_type, _ in groups], n_hormones),
+        "Hormone": np.tile(hormone_columns, len(groups)),
+        "Control N": control_n.ravel(),
+        "Treated N": treated_n.ravel(),
+        "p-value": p_values.ravel(),
+        "Effect Size": effect_sizes.ravel(),
+        "Effect Category": effect_categories.ravel(),
+    })
+    testable = testable.ravel()
+
+    # Interpretation
+    significant = results_df["p-value"] < 0.05
+    results_df["Conclusion"] = np.where(significant, "Significant Difference", "No Significant Difference")
+    results_df["Causation"] = np.where(significant, "Likely Not Random", "Possibly Random or Insufficient Data")
+    results_df.loc[~testable, "Conclusion"] = "Too few samples"
+    results_df.loc[~testable, "Causation"] = "Manual Review Needed"
+
+    # Untestable groups keep the "N/A" markers of the consolidated table
+    results_df["p-value"] = results_df["p-value"].round(4).astype(object)
+    results_df["Effect Size"] = results_df["Effect Size"].astype(object)
+    results_df.loc[~testable, ["p-value", "Effect Size", "Effect Category"]] = "N/A"
+
+    # Restore the hormone -> sample type -> trip ordering of the consolidated table
+    results_df["Hormone"] = pd.Categorical(results_df["Hormone"], categories=hormone_columns)
+    results_df = results_df.sort_values("Hormone", kind="stable").reset_index(drop=True)
+    results_df["Hormone"] = results_df["Hormone"].astype(str)
+
     # Display results
     print("\nMann-Whitney U Test Results (Consolidated):")
     print(results_df.to_string(index=False))
 
     return results_df
 
-# Run analysis and get consolidated results
-final_results = perform_statistical_analysis(df)
+kruskal_columns = ["Sample Type", "Hormone", "Group", "Trips", "N", "H", "p-value", "Conclusion"]
+
+# Function to test for differences between trips with the Kruskal-Wallis test
+@traced
+def perform_kruskal_wallis(df, index=None, ranked=None):
+    """
+    Kruskal-Wallis H test across the trips of every sample type and hormone, separately for
+    the control and the hormone-treated samples. The ranks come from the same sort as the
+    Mann-Whitney U test when ranked (see perform_statistical_analysis) is passed on.
+    Returns one row per hormone, sample type and group (Control / Treated).
+    """
+    hormone_columns = get_hormone_columns(df)
+    if index is None:
+        index = GroupIndex.from_dataset(df)
+    ranked = {} if ranked is None else ranked
+
+    blocks = []
+    for sample_type in df["Sample_Type"].unique():
+        for group, control in [("Control", True), ("Treated", False)]:
+            trips, n, h, p_values = ranked_sample_type(ranked, index, sample_type).kruskal_wallis(control)
+            blocks.append(pd.DataFrame({"Sample Type": sample_type, "Hormone": hormone_columns, "Group": group,
+                                        "Trips": trips, "N": n, "H": h, "p-value": p_values}))
+    if not blocks:
+        return pd.DataFrame(columns=kruskal_columns)
+    kruskal_df = pd.concat(blocks, ignore_index=True)
+
+    # Interpretation; at least two trips and more values than trips are needed
+    testable = (kruskal_df["Trips"] >= 2) & (kruskal_df["N"] > kruskal_df["Trips"]) & kruskal_df["p-value"].notna()
+    kruskal_df["Conclusion"] = np.where(kruskal_df["p-value"] < 0.05, "Significant Difference Between Trips",
+                                        "No Significant Difference Between Trips")
+    kruskal_df.loc[~testable, "Conclusion"] = "Too few samples"
+    kruskal_df[["H", "p-value"]] = kruskal_df[["H", "p-value"]].round(4).astype(object)
+    kruskal_df.loc[~testable, ["H", "p-value"]] = "N/A"
+
+    # Same hormone -> sample type ordering as the Mann-Whitney results
+    kruskal_df["Hormone"] = pd.Categorical(kruskal_df["Hormone"], categories=hormone_columns)
+    kruskal_df = kruskal_df.sort_values("Hormone", kind="stable").reset_index(drop=True)
+    kruskal_df["Hormone"] = kruskal_df["Hormone"].astype(str)
+    return kruskal_df[kruskal_columns]
+
+interval_columns = ["Trip", "Sample Type", "Hormone", "Effect Size", "Effect CI Low", "Effect CI High",
+                    "Permutation p-value", "Exact Permutation"]
+
+# Function to add bootstrap intervals and permutation p-values to the effect sizes
+@traced
+def resample_effect_sizes(df, results_df, resamples=default_resamples, seed=0, workers=None, index=None):
+    """
+    For every testable row of results_df (see perform_statistical_analysis): a percentile
+    bootstrap confidence interval of Cliff's Delta and a two-sided permutation p-value, exact
+    when the pair has at most resamples distinct splits (see Main/Common/resampling.py).
+    Results depend only on seed, not on workers. Returns one row per results row; untestable
+    rows get "N/A".
+    """
+    if index is None:
+        index = GroupIndex.from_dataset(df)
+    testable = results_df["Conclusion"].ne("Too few samples").to_numpy()
+    pairs = [(index.column(sample_type, trip, True, hormone), index.column(sample_type, trip, False, hormone))
+             for trip, sample_type, hormone in results_df.loc[testable, ["Trip", "Sample Type", "Hormone"]].itertuples(index=False)]
+    estimates, exact = resample_pairs(pairs, resamples=resamples, seed=seed, workers=workers)
+
+    intervals_df = results_df[["Trip", "Sample Type", "Hormone", "Effect Size"]].copy()
+    columns = {"Effect CI Low": np.round(estimates[:, 1], 4), "Effect CI High": np.round(estimates[:, 2], 4),
+               "Permutation p-value": np.round(estimates[:, 3], 4), "Exact Permutation": exact}
+    for col, values in columns.items():
+        # Untestable rows keep the "N/A" markers of the results table
+        filled = np.full(len(intervals_df), "N/A", dtype=object)
+        filled[testable] = values
+        intervals_df[col] = filled
+    return intervals_df[interval_columns]
+
+# Function to describe the work grid of the analysis: its hormones, sample types and trips in the order of a full run
+def analysis_grid(df):
+    """
+    cells are the (hormone, sample type) pairs the analysis can be split by; every cell is
+    tested for all trips.
+    """
+    hormones = get_hormone_columns(df)
+    sample_types = df["Sample_Type"].unique().tolist()
+    return {"hormones": hormones, "sample_types": sample_types, "trips": df["Trip_Number"].unique().tolist(),
+            "cells": [[hormone, sample_type] for hormone in hormones for sample_type in sample_types]}
+
+# Function to put results into the hormone -> sample type -> trip order of a full run
+def order_results(results_df, grid):
+    """
+    Works on results as computed and as read back from CSV as text, by comparing the values
+    as strings.
+    """
+    positions = {col: {str(value): i for i, value in enumerate(grid[key])}
+                 for col, key in [("Hormone", "hormones"), ("Sample Type", "sample_types"), ("Trip", "trips")]}
+    return results_df.sort_values(
+        ["Hormone", "Sample Type", "Trip"], key=lambda col: col.astype(str).map(positions[col.name]), kind="stable",
+    ).reset_index(drop=True)
+
+# Function to test only some (hormone, sample type) cells of the grid
+@traced
+def perform_shard_analysis(df, cells, grid=None):
+    """
+    Gives the rows of a full perform_statistical_analysis run that belong to cells, in the
+    same order. Each sample type is indexed and ranked on its own rows and the hormones of
+    its cells only.
+    """
+    grid = grid or analysis_grid(df)
+    hormones_of = {}
+    for hormone, sample_type in cells:
+        hormones_of.setdefault(sample_type, set()).add(hormone)
+
+    keys = ["Sample_Type", "Trip_Number", "Control"]
+    parts = []
+    for sample_type in grid["sample_types"]:
+        if sample_type not in hormones_of:
+            continue
+        hormones = [hormone for hormone in grid["hormones"] if hormone in hormones_of[sample_type]]
+        part_df = df.loc[df["Sample_Type"] == sample_type, keys + hormones]
+        parts.append(perform_statistical_analysis(part_df, groups=[(sample_type, trip) for trip in grid["trips"]]))
+    if not parts:
+        return pd.DataFrame(columns=results_columns)
+    return order_results(pd.concat(parts, ignore_index=True), grid)
+
+# Function to run one shard of the analysis and store its results in the shard directory
+def run_shard(df, shard, shards, source_hash, directory=default_shard_dir):
+    grid = analysis_grid(df)
+    cells = shard_cells(grid["cells"], shard, shards)
+    print(f"Shard {shard}/{shards}: {len(cells)} of {len(grid['cells'])} (hormone, sample type) cells")
+    results_df = with_null_tables(perform_shard_analysis, df, cells, grid)
+    write_shard(results_df, {"shard": shard, "shards": shards, "source_sha256": source_hash,
+                             "grid": grid, "cells": cells}, directory)
+    return results_df
+
+# Bump when a change to the analysis invalidates stored results
+analysis_version = "mwu-1"
+
+# Function to rerun the analysis only for groups whose input rows changed
+@traced
+def perform_incremental_analysis(df, index=None, ranked=None):
+    """
+    Incremental variant of perform_statistical_analysis: (Sample_Type, Trip_Number) groups
+    whose input rows are unchanged since the last run are taken from the incremental store,
+    only new or changed groups are tested again.
+    Returns the same consolidated results table as a full run.
+    """
+    grid = analysis_grid(df)
+
+    # Groups of the grid without any rows still get a (constant) fingerprint
+    observed = group_fingerprints(df, ["Control"] + grid["hormones"])
+    fingerprints = {(sample_type, trip): observed.get((sample_type, trip), "empty")
+                    for sample_type in grid["sample_types"] for trip in grid["trips"]}
+
+    previous, stored_results = load_group_store("non_parametric", analysis_version)
+    changed = changed_groups(fingerprints, previous)
+    print(f"Incremental run: recomputing {len(changed)} of {len(fingerprints)} groups")
 
-# Save results to CSV for further analysis
-final_results.to_csv("Statistics/Non-Parameteric_Analysis_Results.csv", index=False)
+    new_results = perform_statistical_analysis(df, groups=changed, index=index, ranked=ranked)
+    reused = reusable_rows(stored_results, ["Sample Type", "Trip"], fingerprints, changed)
+    results_df = pd.concat([part for part in [reused, new_results] if part is not None and len(part)], ignore_index=True)
 
-# Load the statistical results
-results_df = pd.read_csv("Statistics/Non-Parameteric_Analysis_Results.csv")
+    # Same hormone -> sample type -> trip ordering as a full run
+    results_df = order_results(results_df, grid)
+
+    save_group_store("non_parametric", analysis_version, fingerprints, results_df)
+    return results_df
 
 # Function to analyze statistical significance
+@traced
 def interpret_results(results_df):
-    # Identify sample types and hormones with significant differences
-    summary = []
-    
-    for hormone in results_df["Hormone"].unique():
-        for sample_type in results_df["Sample Type"].unique():
-            subset = results_df[(results_df["Hormone"] == hormone) & (results_df["Sample Type"] == sample_type)]
-            
-            significant_count = (subset["Conclusion"] == "Significant Difference").sum()
-            total_tests = len(subset)
-            significance_ratio = significant_count / total_tests if total_tests > 0 else 0
-
-            # Determine if hormone treatment is a primary factor
-            if significance_ratio > 0.5:  # More than 50% of trips show significant difference
-                conclusion = "Hormone treatment likely caused changes."
-            elif significance_ratio > 0:
-                conclusion = "Some effect observed, but not consistent."
-            else:
-                conclusion = "No statistical evidence of hormone impact."
-
-            summary.append([hormone, sample_type, significant_count, total_tests, round(significance_ratio, 2), conclusion])
-
-    summary_df = pd.DataFrame(summary, columns=["Hormone", "Sample Type", "Significant Tests", "Total Tests", "Significance Ratio", "Conclusion"])
-    
-    # Save in proper CSV format
-    summary_df.to_csv("Statistics/Hormone_Analysis_Summary.csv", index=False)
+    """
+    Summarizes the results per hormone and sample type: the number of trips with a significant
+    difference, the number of tests, their ratio and what it suggests. Every hormone x sample
+    type pair is reported (pairs without tests as 0 of 0), in order of first appearance.
+    Takes the table from perform_statistical_analysis or read back from its CSV.
+    """
+    # Identify sample types and hormones with significant differences, in one grouped pass
+    significant = results_df["Conclusion"].eq("Significant Difference")
+    counts = significant.groupby([results_df["Hormone"], results_df["Sample Type"]], sort=False).agg(["sum", "size"])
+    pairs = pd.MultiIndex.from_product([results_df["Hormone"].unique(), results_df["Sample Type"].unique()],
+                                       names=["Hormone", "Sample Type"])
+    counts = counts.reindex(pairs, fill_value=0)
+
+    significant_count = counts["sum"].to_numpy(dtype=np.int64)
+    total_tests = counts["size"].to_numpy(dtype=np.int64)
+    significance_ratio = np.divide(significant_count, total_tests, out=np.zeros(len(counts)), where=total_tests > 0)
+
+    # Python's round() on each distinct ratio (there are few), which rounds the decimal value exactly
+    unique_ratios, inverse = np.unique(significance_ratio, return_inverse=True)
+    rounded_ratio = np.array([round(ratio, 2) for ratio in unique_ratios])[inverse.ravel()]
+
+    # Determine if hormone treatment is a primary factor (more than 50% of trips significant)
+    conclusion = np.select(
+        [significance_ratio > 0.5, significance_ratio > 0],
+        ["Hormone treatment likely caused changes.", "Some effect observed, but not consistent."],
+        "No statistical evidence of hormone impact.",
+    )
+
+    summary_df = pd.DataFrame({
+        "Hormone": pairs.get_level_values("Hormone"),
+        "Sample Type": pairs.get_level_values("Sample Type"),
+        "Significant Tests": significant_count,
+        "Total Tests": total_tests,
+        "Significance Ratio": rounded_ratio,
+        "Conclusion": conclusion,
+    })
 
     return summary_df
 
-# Run interpretation and store results
-summary_df = interpret_results(results_df)
+# Function to call an analysis with the exact null distributions cached on disk
+def with_null_tables(analyze, *args, **kwargs):
+    load_null_tables()
+    known_tables = len(exact_null_tables)
+    results_df = analyze(*args, **kwargs)
+    if len(exact_null_tables) > known_tables:
+        save_null_tables()
+    return results_df
+
+# Function to run the full (or incremental) analysis
+def run_analysis(df, incremental=False, index=None, ranked=None):
+    analyze = perform_incremental_analysis if incremental else perform_statistical_analysis
+    return with_null_tables(analyze, df, index=index, ranked=ranked)
+
+# Function to run the analysis from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Mann-Whitney U analysis of control vs. hormone-treated samples")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only recompute (sample type, trip) groups whose input rows changed since the last run")
+    parser.add_argument("--summary-only", action="store_true",
+                        help="only summarize the existing results CSV instead of running the analysis")
+    parser.add_argument("--resamples", type=int, nargs="?", const=default_resamples, default=0, metavar="N",
+                        help=f"add bootstrap confidence intervals and permutation p-values of the effect sizes, "
+                             f"from N resamples (default N: {default_resamples})")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the resampling (default: 0)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes for the resampling (default: number of CPUs, 1 = serial)")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="only test the I-th of N parts of the (hormone, sample type) grid and write its results "
+                             f"to {default_shard_dir}; combine the parts with python -m Main shards merge")
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+    if args.shard:
+        try:
+            shard, shards = parse_shard(args.shard)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.incremental or args.summary_only or args.resamples:
+            parser.error("--shard cannot be combined with --incremental, --summary-only or --resamples")
+        run_shard(load_dataset(), shard, shards, file_hash(cleaned_csv))
+        return
+
+    results_file = "Statistics/Non-Parameteric_Analysis_Results.csv"
+    kruskal_file = "Statistics/Kruskal_Wallis_Results.csv"
+    intervals_file = "Statistics/Effect_Size_Intervals.csv"
+    summary_file = "Statistics/Hormone_Analysis_Summary.csv"
+    if args.summary_only:
+        # Load the statistical results of an earlier run
+        results_df = pd.read_csv(results_file)
+    else:
+        # Load cleaned dataset (typed: categorical Sample_Type/Trip_Number, boolean Control)
+        df = load_dataset()
+
+        # Run analysis and get consolidated results
+        index, ranked = load_group_index(), {}
+        results_df = run_analysis(df, incremental=args.incremental, index=index, ranked=ranked)
+
+        # Save results to CSV for further analysis
+        results_df.to_csv(results_file, index=False)
+
+        # Differences between trips, from the ranks of the Mann-Whitney run
+        perform_kruskal_wallis(df, index=index, ranked=ranked).to_csv(kruskal_file, index=False)
+
+        # Uncertainty of the effect sizes (opt-in, it resamples every testable group)
+        if args.resamples:
+            intervals_df = resample_effect_sizes(df, results_df, resamples=args.resamples, seed=args.seed,
+                                                 workers=args.workers, index=index)
+            intervals_df.to_csv(intervals_file, index=False)
+            print(f"Effect size intervals saved to {intervals_file}")
+
+    # Run interpretation on the results in memory and store the summary in proper CSV format
+    summary_df = interpret_results(results_df)
+    summary_df.to_csv(summary_file, index=False)
+
+    # Indexed copy of both tables for per-hormone and per-sample-type queries
+    save_results_store(results_df, summary_df, sources={"results": results_file, "summary": summary_file})
+
+if __name__ == "__main__":
+    main()
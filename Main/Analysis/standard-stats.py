@@ -1,65 +1,164 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-
-# Load cleaned dataset
-df = pd.read_csv("Statistics/Cleaned_DatasetBio.csv", delimiter=";")
-
-# Ensure Trip_Number is treated as an integer
-df["Trip_Number"] = df["Trip_Number"].astype(int)
-
-# Extract Sample_Type from Sample_Name
-df["Sample_Type"] = df["Sample_Name"].str.extract(r'(\d{2,3})')[0]
-df = df.dropna(subset=["Sample_Type"])  # Remove NaN rows
-df["Sample_Type"] = df["Sample_Type"].astype(int)
-
-# Identify control and hormone-treated samples
-df["Control"] = df["Sample_Name"].str.startswith("K")  # Control samples start with "K"
-
-# Get hormone columns explicitly
-hormone_columns = df.select_dtypes(include=["float64", "int64"]).columns.tolist()
-
-# Set seaborn style
-sns.set_style("whitegrid")
+import argparse
+import os
+import sys
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.dataset import load_dataset, get_hormone_columns, iter_dataset_chunks
+from Main.Common.group_index import GroupIndex, load_group_index
+from Main.Common.box_summary import box_summaries
+from Main.Common.quantile_sketch import QuantileSketch, default_accuracy
+from Main.Common.instrumentation import traced, add_trace_argument, enable_from_args
+from Main.Common.incremental import group_fingerprints, load_group_store, save_group_store, changed_groups, reusable_rows
 
 # Output file for descriptive statistics
 output_file = "Statistics/Standard_statistics.csv"
 
-# Function to compute and save descriptive statistics
-def compute_descriptive_stats(control_data, treated_data, hormone):
-    # Compute descriptive stats for Control samples
-    control_stats = control_data.groupby(["Sample_Type", "Trip_Number"])[hormone].describe()[["min", "50%", "75%", "max"]]
-    control_stats = control_stats.rename(columns={"50%": "median", "75%": "Q3"})
-
-    # Compute descriptive stats for Treated samples
-    treated_stats = treated_data.groupby(["Sample_Type", "Trip_Number"])[hormone].describe()[["min", "50%", "75%", "max"]]
-    treated_stats = treated_stats.rename(columns={"50%": "median", "75%": "Q3"})
-
-    # Merge statistics side by side
-    merged_stats = pd.merge(control_stats, treated_stats, on=["Sample_Type", "Trip_Number"], 
-                            suffixes=("_Control", "_Treated"), how="outer")
-
-    return merged_stats
-
-# Prepare a list to store results for all hormones
-all_stats = []
-
-# Loop through each hormone, compute stats, and plot
-for hormone in hormone_columns:
-    # Separate control and treated data
-    control_data = df[df["Control"]]
-    treated_data = df[~df["Control"]]
-
-    # Compute and store side-by-side stats
-    stats_df = compute_descriptive_stats(control_data, treated_data, hormone)
-    stats_df.insert(0, "Hormone", hormone)  # Add hormone name as first column
-    all_stats.append(stats_df)
-
-# Concatenate all statistics into one DataFrame
-final_stats_df = pd.concat(all_stats)
-
-# Save structured CSV output
-final_stats_df.to_csv(output_file, index=True)
-
-print(f"Descriptive statistics saved to {output_file}")
+# Quantiles reported per group; 0 and 1 are the min and max
+stat_quantiles = {0.0: "min", 0.5: "median", 0.75: "Q3", 1.0: "max"}
+
+# Function to compute the side-by-side stats of every hormone in one pass
+@traced
+def compute_descriptive_stats(df, index=None, summaries=None):
+    """
+    Takes min/median/Q3/max of every hormone x sample type x trip x control cell from the box
+    summaries (see Main/Common/box_summary.py), computed in one grouped pass over the GroupIndex
+    matrix unless given; the index is built from df when not given.
+    Returns one row per hormone and (Sample_Type, Trip_Number) group with the Control and
+    Treated statistics side by side, indexed by Sample_Type and Trip_Number.
+    """
+    if index is None:
+        index = GroupIndex.from_dataset(df)
+    if summaries is None:
+        summaries = box_summaries(index)
+    n_hormones, n_groups = len(index.hormones), len(index)
+    quantiles = summaries.table[list(stat_quantiles.values())].to_numpy(dtype=float)
+    quantiles = quantiles.reshape(n_hormones, n_groups, len(stat_quantiles))
+
+    # Groups are sorted by (Sample_Type, Trip_Number, Control): number the (Sample_Type, Trip_Number) pairs
+    keys = index.key_frame()
+    new_pair = keys[["Sample_Type", "Trip_Number"]].ne(keys[["Sample_Type", "Trip_Number"]].shift()).any(axis=1).to_numpy()
+    pair_ids = np.cumsum(new_pair) - 1
+    pairs = keys.loc[new_pair, ["Sample_Type", "Trip_Number"]].reset_index(drop=True)
+    sides = np.where(keys["Control"].to_numpy(dtype=bool), 0, 1)
+
+    # Pivot to one column per statistic and Control/Treated side
+    side_by_side = np.full((n_hormones, len(pairs), 2, len(stat_quantiles)), np.nan)
+    side_by_side[:, pair_ids, sides] = quantiles
+    stats = pd.DataFrame(side_by_side.reshape(n_hormones * len(pairs), -1),
+                         columns=[f"{stat}_{side}" for side in ["Control", "Treated"] for stat in stat_quantiles.values()])
+
+    # Hormone -> sample type -> trip ordering
+    stats.insert(0, "Hormone", np.repeat(index.hormones, len(pairs)))
+    stats.index = pd.MultiIndex.from_frame(pairs.iloc[np.tile(np.arange(len(pairs)), n_hormones)])
+    return stats
+
+sketch_keys = ["Hormone", "Sample_Type", "Trip_Number", "Control"]
+
+# Function to sketch the hormone values of one chunk of the dataset (can run in a worker)
+def sketch_chunk(chunk, relative_accuracy=default_accuracy):
+    keys = ["Sample_Type", "Trip_Number", "Control"]
+    long_df = chunk[keys + get_hormone_columns(chunk)].melt(id_vars=keys, var_name="Hormone", value_name="Value")
+    return QuantileSketch(sketch_keys, relative_accuracy).add(long_df)
+
+# Function to turn a merged sketch into the table of compute_descriptive_stats
+def sketched_stats(sketch, hormone_columns):
+    stats = sketch.quantiles(list(stat_quantiles))
+    stats.columns = list(stat_quantiles.values())
+
+    # Pivot to one column per statistic and Control/Treated side
+    stats = stats.unstack("Control")
+    stats.columns = [f"{stat}_{'Control' if control else 'Treated'}" for stat, control in stats.columns]
+    stats = stats.reindex(columns=[f"{stat}_{side}" for side in ["Control", "Treated"] for stat in stat_quantiles.values()])
+
+    stats = stats.reset_index()
+    stats["Hormone"] = pd.Categorical(stats["Hormone"], categories=hormone_columns)
+    stats = stats.sort_values(["Hormone", "Sample_Type", "Trip_Number"])
+    stats["Hormone"] = stats["Hormone"].astype(str)
+    return stats.set_index(["Sample_Type", "Trip_Number"])
+
+# Function to compute approximate stats from mergeable quantile sketches
+@traced
+def compute_sketched_stats(chunks, relative_accuracy=default_accuracy):
+    """
+    Approximate compute_descriptive_stats for groups too large to hold in memory: every chunk
+    of the dataset (see iter_dataset_chunks) is sketched and the partial sketches are merged.
+    Min and max are exact; the median and Q3 are within relative_accuracy (relative error) of
+    the exact values.
+    """
+    sketch = QuantileSketch(sketch_keys, relative_accuracy)
+    hormone_columns = []
+    for chunk in chunks:
+        hormone_columns += [col for col in get_hormone_columns(chunk) if col not in hormone_columns]
+        sketch.merge(sketch_chunk(chunk, relative_accuracy))
+    return sketched_stats(sketch, hormone_columns)
+
+# Bump when a change to the statistics invalidates stored results
+stats_version = "describe-1"
+
+# Function to recompute stats only for groups whose input rows changed
+@traced
+def compute_all_stats_incremental(df):
+    """
+    Incremental variant of compute_descriptive_stats: (Sample_Type, Trip_Number) groups whose input
+    rows are unchanged since the last run are taken from the incremental store.
+    """
+    hormone_columns = get_hormone_columns(df)
+    fingerprints = group_fingerprints(df, ["Control"] + hormone_columns)
+    previous, stored_stats = load_group_store("standard_stats", stats_version)
+    changed = changed_groups(fingerprints, previous)
+    print(f"Incremental run: recomputing {len(changed)} of {len(fingerprints)} groups")
+
+    parts = [reusable_rows(stored_stats, ["Sample_Type", "Trip_Number"], fingerprints, changed)]
+    if changed:
+        group_keys = pd.MultiIndex.from_frame(df[["Sample_Type", "Trip_Number"]])
+        parts.append(compute_descriptive_stats(df[group_keys.isin(changed)]).reset_index())
+    stats_df = pd.concat([part for part in parts if part is not None], ignore_index=True)
+
+    # Same hormone -> sample type -> trip ordering as a full run
+    stats_df["Hormone"] = pd.Categorical(stats_df["Hormone"], categories=hormone_columns)
+    stats_df = stats_df.sort_values(["Hormone", "Sample_Type", "Trip_Number"]).reset_index(drop=True)
+    stats_df["Hormone"] = stats_df["Hormone"].astype(str)
+
+    save_group_store("standard_stats", stats_version, fingerprints, stats_df)
+    return stats_df.set_index(["Sample_Type", "Trip_Number"])
+
+# Function to compute the descriptive statistics from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Descriptive statistics of control vs. hormone-treated samples")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only recompute (sample type, trip) groups whose input rows changed since the last run")
+    parser.add_argument("--approximate", type=float, nargs="?", const=default_accuracy, metavar="ACCURACY",
+                        help="stream the dataset in chunks and estimate the quantiles from mergeable sketches, "
+                             f"within a relative error of ACCURACY (default: {default_accuracy})")
+    parser.add_argument("--chunksize", type=int, default=100000, help="rows per chunk with --approximate")
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+    if args.approximate is not None and args.incremental:
+        parser.error("--approximate and --incremental cannot be combined")
+
+    if args.approximate is not None:
+        # Never holds more than one chunk of the dataset in memory
+        final_stats_df = compute_sketched_stats(iter_dataset_chunks(args.chunksize), args.approximate)
+        final_stats_df.to_csv(output_file, index=True)
+        print(f"Approximate descriptive statistics saved to {output_file}")
+        return
+
+    # Load cleaned dataset (typed: categorical Sample_Type/Trip_Number, boolean Control)
+    df = load_dataset()
+
+    if args.incremental:
+        final_stats_df = compute_all_stats_incremental(df)
+    else:
+        final_stats_df = compute_descriptive_stats(df, index=load_group_index())
+
+    # Save structured CSV output
+    final_stats_df.to_csv(output_file, index=True)
+
+    print(f"Descriptive statistics saved to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Synthetic datasets and benchmarks.
+"""
@@ -0,0 +1,240 @@
+"""
+Benchmarks of the cleaning, analysis and plotting code on synthetic datasets.
+
+Every scale writes a generated export (see generate_dataset.py) into a scratch directory and
+runs the stages there, so the real Statistics/ folder is never touched. Each benchmark is
+timed over a number of repeats (best and median wall time) and run once more under
+tracemalloc for its peak memory. Results are stored as JSON in Statistics/Benchmarks/ and can
+be compared with an earlier run:
+
+    python Main/Benchmarks/benchmark_suite.py --scales small medium --compare Statistics/Benchmarks/<old>.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Benchmarks.generate_dataset import write_dataset
+from Main.Common.dataset import load_dataset, get_hormone_columns, _dataset_memo
+from Main.Common.scripts import load_script
+from Main.Common.group_index import GroupIndex
+from Main.Common.box_summary import box_summaries
+from Main.Common.rendering import render_figures
+
+results_dir = os.path.abspath("Statistics/Benchmarks")
+
+# Dataset sizes: sample types, trips, replicates per side and hormone columns
+scales = {
+    "small": dict(n_sample_types=9, n_trips=4, n_replicates=4, n_hormones=14),  # Size of DatasetBio.csv
+    "medium": dict(n_sample_types=30, n_trips=8, n_replicates=8, n_hormones=30),
+    "large": dict(n_sample_types=100, n_trips=12, n_replicates=16, n_hormones=50),
+}
+
+# Figures rendered per plotting benchmark; the cost per figure grows with the number of groups
+plot_sample = 4
+
+# Function to time a callable and measure its peak Python memory
+def measure(func, repeat):
+    """
+    Returns best and median wall time, CPU time of the best run and peak traced memory
+    (numpy and pandas buffers included) of one extra traced run. Output is discarded.
+    """
+    wall_times, cpu_times = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            func()
+            wall_times.append(time.perf_counter() - wall_start)
+            cpu_times.append(time.process_time() - cpu_start)
+
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    best = int(np.argmin(wall_times))
+    return {"best_s": wall_times[best], "median_s": float(np.median(wall_times)),
+            "cpu_s": cpu_times[best], "peak_mb": peak / 2**20, "repeat": repeat}
+
+# Function to check that a plotting benchmark drew the trips and sample types of its own dataset
+def check_figure(name, template, trips, sample_types, other_labels=()):
+    """
+    Compares the x tick labels and the legend of the template's first axes with the dataset,
+    so a template left over from another scale cannot go unnoticed in the timings.
+    other_labels are legend entries that are not sample types (e.g. a threshold line).
+    """
+    ax = template.axes[0]
+    drawn_trips = [label.get_text() for label in ax.get_xticklabels()]
+    legend = sorted(text.get_text() for text in ax.get_legend().get_texts())
+    expected_legend = sorted([str(sample_type) for sample_type in sample_types] + list(other_labels))
+    if drawn_trips != [str(trip) for trip in trips] or legend != expected_legend:
+        raise RuntimeError(f"{name} drew {len(drawn_trips)} trips and {len(legend)} legend entries instead of "
+                           f"the {len(trips)} trips and {len(sample_types)} sample types of the dataset")
+
+# Function to build the benchmarks of one dataset, run from the scratch directory
+def benchmarks(include_plots):
+    """
+    Returns (name, callable, repeat) tuples; later benchmarks use the outputs of earlier ones.
+    """
+    cleaning = load_script("Cleaning.cleaning_main")
+    analysis = load_script("Analysis.non-parametric-method")
+    standard_stats = load_script("Analysis.standard-stats")
+    state = {}
+
+    def clean():
+        cleaning.clean_dataset()
+
+    def load():
+        _dataset_memo.clear()  # Measure the read, not the memo
+        state["df"] = load_dataset()
+
+    def statistical_analysis():
+        state["results"] = analysis.perform_statistical_analysis(state["df"])
+
+    def cliffs_delta_pairs():
+        # One call per (sample type, trip, hormone), as a caller testing pairs one by one would
+        df = state["df"]
+        hormones = get_hormone_columns(df)
+        for _, group in df.groupby(["Sample_Type", "Trip_Number"], observed=True):
+            control, treated = group[group["Control"]], group[~group["Control"]]
+            for hormone in hormones:
+                analysis.cliffs_delta(control[hormone].dropna(), treated[hormone].dropna())
+
+    def kruskal_wallis():
+        analysis.perform_kruskal_wallis(state["df"])
+
+    def interpret():
+        analysis.interpret_results(state["results"])
+
+    def descriptive_stats():
+        standard_stats.compute_descriptive_stats(state["df"])
+
+    cases = [("cleaning", clean, 3), ("load_dataset", load, 3),
+             ("perform_statistical_analysis", statistical_analysis, 3),
+             ("cliffs_delta", cliffs_delta_pairs, 3), ("kruskal_wallis", kruskal_wallis, 3),
+             ("interpret_results", interpret, 3),
+             ("standard_stats", descriptive_stats, 3)]
+
+    if include_plots:
+        # Serial rendering of the first plot_sample hormones, so the figures are drawn (and traced) here
+        def plot_case(name, module, render, template, data, hormones, trips, sample_types, other_labels=()):
+            def run():
+                failures = render_figures(getattr(module, render), hormones()[:plot_sample], workers=1,
+                                          setup=module.set_plot_data, setup_args=(data(),))
+                if failures:
+                    raise RuntimeError(f"{name} failed for {', '.join(failures)}")
+                check_figure(name, getattr(module, template), trips(), sample_types(), other_labels)
+            return name, run, 1
+
+        # Box plots are drawn from the box summaries, bar charts from the dataset
+        dataset_trips = lambda: sorted(state["df"]["Trip_Number"].unique())
+        dataset_sample_types = lambda: sorted(state["df"]["Sample_Type"].unique())
+        hormones = lambda: get_hormone_columns(state["df"])
+        cases.append(plot_case("box_plots", load_script("Visualisation.box_plot_version"), "render_box_plot",
+                               "box_template", lambda: box_summaries(GroupIndex.from_dataset(state["df"])),
+                               hormones, dataset_trips, dataset_sample_types))
+        cases.append(plot_case("bar_charts", load_script("Visualisation.base_bar_chart"), "render_bar_chart",
+                               "bar_template", lambda: state["df"], hormones, dataset_trips, dataset_sample_types))
+
+        p_values = load_script("Visualisation.generate_p-value")
+        plotted = lambda: p_values.plotted_results(state["results"])
+        cases.append(plot_case("p_value_plots", p_values, "render_p_value_plot", "p_value_template",
+                               lambda: state["results"], lambda: list(plotted()["Hormone"].unique()),
+                               lambda: sorted(plotted()["Trip"].unique()), lambda: sorted(plotted()["Sample Type"].unique()),
+                               [f"Significance Threshold (p={p_values.significance_threshold})"]))
+    return cases
+
+# Function to run every benchmark at the given scales
+def run_suite(scale_names, include_plots=True, seed=0):
+    records = []
+    start_dir = os.getcwd()
+    for scale in scale_names:
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            try:
+                dataset = write_dataset("Statistics/DatasetBio.csv", seed=seed, **scales[scale])
+                print(f"\n{scale}: {len(dataset)} samples x {len(dataset.columns) - 2} hormones")
+                for name, func, repeat in benchmarks(include_plots):
+                    record = {"scale": scale, "benchmark": name, "rows": len(dataset), **scales[scale],
+                              **measure(func, repeat)}
+                    records.append(record)
+                    print(f"  {name:<30} best {record['best_s']:8.3f} s   median {record['median_s']:8.3f} s"
+                          f"   peak {record['peak_mb']:8.1f} MB")
+            finally:
+                os.chdir(start_dir)
+    return pd.DataFrame(records)
+
+# Function to describe the machine and code version a run was made with
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+# Function to store a run for later comparison
+def save_results(results, path=None):
+    info = environment()
+    if path is None:
+        os.makedirs(results_dir, exist_ok=True)
+        path = os.path.join(results_dir, f"benchmark-{info['timestamp'].replace(':', '')}.json")
+    with open(path, "w") as f:
+        json.dump({"environment": info, "results": results.to_dict(orient="records")}, f, indent=2)
+    return path
+
+def load_results(path):
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)["results"])
+
+# Function to compare two runs benchmark by benchmark
+def compare_results(baseline, current):
+    """
+    Returns the best times and peak memory of both runs side by side, with the ratio
+    current / baseline (below 1 is faster or smaller).
+    """
+    keys = ["scale", "benchmark"]
+    merged = baseline[keys + ["best_s", "peak_mb"]].merge(current[keys + ["best_s", "peak_mb"]],
+                                                          on=keys, suffixes=("_baseline", "_current"))
+    merged["time_ratio"] = (merged["best_s_current"] / merged["best_s_baseline"]).round(3)
+    merged["memory_ratio"] = (merged["peak_mb_current"] / merged["peak_mb_baseline"]).round(3)
+    return merged
+
+# Function to run the benchmarks from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Time and memory-profile the pipeline stages on synthetic data")
+    parser.add_argument("--scales", nargs="+", choices=list(scales), default=["small", "medium"])
+    parser.add_argument("--no-plots", action="store_true", help="skip the plotting benchmarks")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated datasets")
+    parser.add_argument("--output", help="result file (default: Statistics/Benchmarks/benchmark-<time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier result file to compare this run with")
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    results = run_suite(args.scales, include_plots=not args.no_plots, seed=args.seed)
+    print(f"\nResults saved to {save_results(results, args.output)}")
+
+    if args.compare:
+        print(f"\nCompared with {args.compare}:")
+        print(compare_results(load_results(args.compare), results).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
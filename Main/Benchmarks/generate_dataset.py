@@ -0,0 +1,93 @@
+"""
+Synthetic datasets in the format of the instrument export (Statistics/DatasetBio.csv).
+
+The file has a metadata line, a "#;Muestra;<hormones>" header and one row per sample with
+semicolon separators, decimal commas and names like "K1 - 887 - A" (replicate, sample type,
+trip). Every sample type is measured on every trip for every control (K) and hormone-treated
+(GA) replicate. Values are log-normal per hormone and sample type, treated replicates are
+shifted by a random effect, and a fraction of the values is reported as "N/F".
+"""
+import argparse
+import os
+import string
+import numpy as np
+import pandas as pd
+
+# Hormone columns of the real export; larger datasets continue with H1, H2, ...
+known_hormones = ["GA4", "GA1", "GA7", "GA3", "GA5", "GA34", "GA8", "ABA", "JA", "IAA", "SA", "DHZ", "iP", "tZ"]
+
+# Function to name the hormone columns
+def hormone_names(n_hormones):
+    extra = [f"H{i}" for i in range(1, n_hormones - len(known_hormones) + 1)]
+    return (known_hormones + extra)[:n_hormones]
+
+# Function to generate a synthetic export as a DataFrame
+def generate_dataset(n_sample_types=9, n_trips=4, n_replicates=4, n_hormones=14,
+                     missing_fraction=0.005, seed=0):
+    """
+    Returns the rows of a synthetic export with n_replicates control and n_replicates
+    treated replicates for every sample type and trip (2 * n_replicates * n_sample_types
+    * n_trips rows). Sample types are distinct 2-3 digit numbers, trips are letters.
+    """
+    if not 1 <= n_trips <= len(string.ascii_uppercase):
+        raise ValueError(f"n_trips must be between 1 and {len(string.ascii_uppercase)}")
+    if not 1 <= n_sample_types <= 990:
+        raise ValueError("n_sample_types must be between 1 and 990 (two or three digits)")
+
+    rng = np.random.default_rng(seed)
+    sample_types = np.sort(rng.choice(np.arange(10, 1000), size=n_sample_types, replace=False))
+    trips = list(string.ascii_uppercase[:n_trips])
+    replicates = [f"K{i}" for i in range(1, n_replicates + 1)] + [f"GA{i}" for i in range(1, n_replicates + 1)]
+    hormones = hormone_names(n_hormones)
+
+    # Rows in the order of the real export: trip, then sample type, then replicate
+    trip_idx, type_idx, replicate_idx = (index.ravel() for index in np.meshgrid(
+        np.arange(n_trips), np.arange(n_sample_types), np.arange(len(replicates)), indexing="ij"))
+    treated = replicate_idx >= n_replicates
+    n_rows = len(trip_idx)
+
+    # Log-normal levels per hormone and sample type, drifting over trips, plus a treatment effect
+    base = rng.normal(0, 2, size=(n_sample_types, n_hormones))
+    drift = rng.normal(0, 0.2, size=(n_trips, n_hormones))
+    effect = rng.normal(0, 0.5, size=(n_sample_types, n_hormones)) * (rng.random(n_hormones) < 0.5)
+    log_values = (base[type_idx] + drift[trip_idx] + treated[:, None] * effect[type_idx]
+                  + rng.normal(0, 0.4, size=(n_rows, n_hormones)))
+    values = np.round(np.exp(log_values), 3)
+    values[rng.random(values.shape) < missing_fraction] = np.nan  # Written as "N/F"
+    values = pd.DataFrame(values, columns=hormones)
+
+    names = pd.Series(np.array(replicates)[replicate_idx]) + " - " + \
+        pd.Series(sample_types[type_idx].astype(str)) + " - " + pd.Series(np.array(trips)[trip_idx])
+    rows = pd.DataFrame({"#": [f"L{i}" for i in range(83, 83 + n_rows)], "Muestra": names})
+    return pd.concat([rows, values], axis=1)
+
+# Function to write a synthetic dataset in the export format
+def write_dataset(path, **kwargs):
+    df = generate_dataset(**kwargs)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        # Metadata line of the instrument export
+        f.write(";;Sample amount (ngH/g FW or DW)" + ";" * (len(df.columns) - 3) + "\n")
+        # Decimal commas as in the instrument export, "N/F" where nothing was found
+        df.to_csv(f, sep=";", decimal=",", na_rep="N/F", index=False)
+    return df
+
+# Function to write a synthetic dataset from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Write a synthetic dataset in the DatasetBio.csv format")
+    parser.add_argument("output", help="path of the CSV file to write")
+    parser.add_argument("--sample-types", type=int, default=9)
+    parser.add_argument("--trips", type=int, default=4)
+    parser.add_argument("--replicates", type=int, default=4, help="replicates per control and treated group")
+    parser.add_argument("--hormones", type=int, default=14)
+    parser.add_argument("--missing", type=float, default=0.005, help="fraction of values reported as N/F")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    df = write_dataset(args.output, n_sample_types=args.sample_types, n_trips=args.trips,
+                       n_replicates=args.replicates, n_hormones=args.hormones,
+                       missing_fraction=args.missing, seed=args.seed)
+    print(f"Wrote {len(df)} samples x {len(df.columns) - 2} hormones to {args.output}")
+
+if __name__ == "__main__":
+    main()
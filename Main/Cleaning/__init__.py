@@ -0,0 +1,3 @@
+"""
+Cleaning of the raw instrument export.
+"""
@@ -1,16 +1,71 @@
 import pandas as pd
+import argparse
+import os
+import sys
 
-# Load dataset with correct delimiter and skip first row (metadata)
-df = pd.read_csv("Statistics\DatasetBio.csv", delimiter=";", skiprows=1)
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.dataset import DatasetCacheWriter, parse_sample_names
+from Main.Common.instrumentation import traced
 
-# Rename columns correctly
-df.columns = ["Sample_Number", "Sample_Name"] + df.columns[2:].tolist()
-# Convert hormone data to numeric, replacing commas and handling missing values
-for col in df.columns[2:]:
-    df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", "."), errors="coerce")
+input_file = "Statistics/DatasetBio.csv"
+output_file = "Statistics/Cleaned_DatasetBio.csv"
 
-df["Control"] = df["Sample_Name"].str.strip().str[0] == "K"
-df["Hormone_Treated"] = df["Sample_Name"].str.contains(r"\bGA[1-4]\b", regex=True)
-trip_map = {"A": 1, "B": 2, "C": 3, "D": 4}
-df["Trip_Number"] = df["Sample_Name"].str.strip().str[-1].map(trip_map)
-df.to_csv("Statistics/Cleaned_DatasetBio.csv", index=False, sep=";")
+# Rows parsed per chunk; peak memory depends on this, not on the size of the export
+chunk_size = 50_000
+
+# Function to clean one chunk of the instrument export
+@traced
+def clean_chunk(chunk):
+    # Rename columns correctly
+    chunk.columns = ["Sample_Number", "Sample_Name"] + chunk.columns[2:].tolist()
+
+    # Hormone values are parsed as decimal-comma floats by read_csv; columns holding
+    # non-numeric entries (e.g. "N/F") fall back to coercion, which turns those entries into NaN
+    for col in chunk.columns[2:]:
+        if not pd.api.types.is_numeric_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(chunk[col].astype(str).str.replace(",", "."), errors="coerce")
+
+    # Control, treatment and trip (A=1, B=2, ...) come from the shared sample-name parser
+    parsed = parse_sample_names(chunk["Sample_Name"])
+    chunk["Control"] = parsed["Control"].to_numpy()
+    chunk["Hormone_Treated"] = parsed["Replicate"].isin(["GA1", "GA2", "GA3", "GA4"]).to_numpy()
+    # Nullable integers keep the same formatting in every chunk, even if a trip letter is unknown
+    chunk["Trip_Number"] = parsed["Trip_Number"].astype("Int64").to_numpy()
+    return chunk
+
+# Function to stream the raw export through the cleaner chunk by chunk
+@traced
+def clean_dataset(input_file=input_file, output_file=output_file, chunk_size=chunk_size):
+    # Start from an empty output so chunks are not appended to a previous run
+    if os.path.exists(output_file):
+        os.remove(output_file)
+
+    # Load dataset with correct delimiter and decimal comma, skipping the first row (metadata)
+    reader = pd.read_csv(input_file, delimiter=";", decimal=",", skiprows=1,
+                         float_precision="round_trip", chunksize=chunk_size)
+    # The typed Arrow copy is written alongside the CSV for the analysis and plotting scripts,
+    # to the cache of output_file (see cache_path), stamped with output_file's hash
+    with reader, DatasetCacheWriter(csv_file=output_file) as cache:
+        for i, chunk in enumerate(reader):
+            chunk = clean_chunk(chunk)
+            chunk.to_csv(output_file, index=False, sep=";", mode="a", header=(i == 0))
+            cache.write(chunk)
+
+# Function to clean the whole raw export in memory, for callers that keep the result
+@traced
+def clean_in_memory(input_file=input_file):
+    df = pd.read_csv(input_file, delimiter=";", decimal=",", skiprows=1, float_precision="round_trip")
+    return clean_chunk(df)
+
+# Function to clean the raw export from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Clean the raw instrument export into the typed dataset")
+    parser.add_argument("--input", default=input_file, help=f"raw export to clean (default: {input_file})")
+    parser.add_argument("--output", default=output_file, help=f"cleaned CSV to write (default: {output_file})")
+    args = parser.parse_args(argv)
+
+    clean_dataset(args.input, args.output)
+
+if __name__ == "__main__":
+    main()
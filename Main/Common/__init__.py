@@ -0,0 +1,3 @@
+"""
+Shared helpers of the cleaning, analysis and plotting scripts.
+"""
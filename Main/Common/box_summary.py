@@ -0,0 +1,121 @@
+"""
+Box-plot summaries of every hormone in every (Sample_Type, Trip_Number, Control) group.
+
+All values of the GroupIndex matrix are sorted once by (cell, value), where the cell of value
+(row, hormone) is hormone * groups + group of the row. Every cell is then a contiguous run of
+sorted values, and its quartiles, whiskers and fliers are read from that run by offset for all
+cells at once. The statistics follow matplotlib's boxplot_stats (linear quartiles, whiskers at
+the furthest values within whis * IQR of the box), so the boxes drawn from the summaries with
+Axes.bxp are the ones seaborn's boxplot would draw from the raw values.
+"""
+import numpy as np
+from Main.Common.instrumentation import traced
+
+box_summary_file = "Statistics/Box_Plot_Summaries.csv"
+
+# Summary columns per cell, after Hormone and the group keys
+box_columns = ["N", "min", "Q1", "median", "Q3", "max", "whislo", "whishi", "fliers"]
+
+# Function to sort values by cell, with the start and size of every cell's run
+def sort_by_cell(values, cell_ids, n_cells):
+    """
+    NaN values are left out. Returns (sorted values, cell of every sorted value, starts, counts).
+    """
+    valid = ~np.isnan(values)
+    values, cell_ids = values[valid], cell_ids[valid]
+    order = np.lexsort((values, cell_ids))
+    counts = np.bincount(cell_ids, minlength=n_cells)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return values[order], cell_ids[order], starts, counts
+
+# Function to read quantiles of every cell from the values sorted by cell
+def sorted_quantiles(sorted_values, starts, counts, quantiles):
+    """
+    Linear-interpolated quantiles (numpy's default, as used by describe()); cells without
+    values get NaN. Returns an (n_cells x quantiles) array.
+    """
+    result = np.full((len(counts), len(quantiles)), np.nan)
+    has_values = counts > 0
+    n = counts[has_values]
+    start = starts[has_values]
+
+    for i, q in enumerate(quantiles):
+        # Same virtual index ((n - 1) * q) and interpolation steps as np.percentile(method="linear"),
+        # in the same order of operations, so the quantiles are bit-identical to describe()'s
+        virtual_index = (n - 1) * q
+        previous_index = np.floor(virtual_index)
+        gamma = virtual_index - previous_index
+        previous_index = np.clip(previous_index.astype(int), 0, n - 1)
+        next_index = np.clip(previous_index + 1, 0, n - 1)
+        a = sorted_values[start + previous_index]
+        b = sorted_values[start + next_index]
+        diff = b - a
+        result[has_values, i] = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+    return result
+
+class BoxSummaries:
+    """
+    table: one row per (Hormone, Sample_Type, Trip_Number, Control) cell, hormone-major in the
+    group order of the index, with the box_columns ("fliers" is the number of fliers).
+    The flier values of row i are flier_values[flier_offsets[i]:flier_offsets[i + 1]], sorted.
+    """
+
+    def __init__(self, table, flier_values, flier_offsets):
+        self.table = table
+        self.flier_values = flier_values
+        self.flier_offsets = flier_offsets
+
+    # Function to get the fliers of one row of the table as a view
+    def fliers(self, row):
+        return self.flier_values[self.flier_offsets[row]:self.flier_offsets[row + 1]]
+
+    # Function to select the rows of one hormone and side that have values
+    def rows(self, hormone, control):
+        table = self.table
+        return table[(table["Hormone"] == hormone) & (table["Control"] == bool(control)) & (table["N"] > 0)]
+
+    # Function to turn rows of the table into the box statistics Axes.bxp draws
+    def bxp_stats(self, rows):
+        return [{"med": row.median, "q1": row.Q1, "q3": row.Q3, "whislo": row.whislo, "whishi": row.whishi,
+                 "fliers": self.fliers(i)}
+                for i, row in zip(rows.index, rows.itertuples(index=False))]
+
+    # Function to get the table with the flier values written out, for export
+    def export_table(self):
+        table = self.table.copy()
+        table["flier_values"] = [" ".join(f"{value:g}" for value in self.fliers(i)) for i in range(len(table))]
+        return table
+
+# Function to summarize every hormone of every group of a GroupIndex in one pass
+@traced
+def box_summaries(index, whis=1.5):
+    """
+    Returns the BoxSummaries of every hormone x group cell of index; cells without values
+    have N = 0 and NaN statistics.
+    """
+    n_hormones, n_groups = len(index.hormones), len(index)
+    n_cells = n_hormones * n_groups
+    cells = (np.arange(n_hormones) * n_groups + index.group_ids()[:, None]).ravel()
+    sorted_values, cell_of, starts, counts = sort_by_cell(np.asarray(index.values, dtype=float).ravel(), cells, n_cells)
+    low, q1, median, q3, high = sorted_quantiles(sorted_values, starts, counts, [0, 0.25, 0.5, 0.75, 1]).T
+
+    # Whiskers reach the furthest values within whis * IQR of the box, but never into it
+    iqr = q3 - q1
+    inside = (sorted_values >= (q1 - whis * iqr)[cell_of]) & (sorted_values <= (q3 + whis * iqr)[cell_of])
+    whislo = np.full(n_cells, np.inf)
+    whishi = np.full(n_cells, -np.inf)
+    np.minimum.at(whislo, cell_of[inside], sorted_values[inside])
+    np.maximum.at(whishi, cell_of[inside], sorted_values[inside])
+    whislo = np.where(counts > 0, np.where(whislo > q1, q1, whislo), np.nan)
+    whishi = np.where(counts > 0, np.where(whishi < q3, q3, whishi), np.nan)
+
+    # Fliers stay in (cell, value) order, so each cell's fliers are one sorted run
+    flier = (sorted_values < whislo[cell_of]) | (sorted_values > whishi[cell_of])
+    flier_counts = np.bincount(cell_of[flier], minlength=n_cells)
+
+    keys = index.key_frame()
+    table = keys.iloc[np.tile(np.arange(n_groups), n_hormones)].reset_index(drop=True)
+    table.insert(0, "Hormone", np.repeat(index.hormones, n_groups))
+    for column, values in zip(box_columns, [counts, low, q1, median, q3, high, whislo, whishi, flier_counts]):
+        table[column] = values
+    return BoxSummaries(table, sorted_values[flier], np.r_[0, np.cumsum(flier_counts)])
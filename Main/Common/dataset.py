@@ -0,0 +1,220 @@
+"""
+Shared, typed access to the cleaned dataset.
+
+The cleaning stage writes Statistics/Cleaned_DatasetBio.csv and, when pyarrow is installed,
+a typed Arrow (Feather) copy of it: float hormone columns, categorical sample-name columns
+and a boolean Control flag. Scripts load the dataset through load_dataset(), which reads the
+Arrow file (with column projection and memory mapping) and only falls back to parsing the
+CSV when the cache is missing or was built from a different version of the CSV.
+
+Sample names ("GA3 - 698 - B") are parsed in one place, parse_sample_names(), so every
+script derives Sample_Type, Trip_Number and Control the same way.
+"""
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from Main.Common.instrumentation import traced
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # The cache is optional, without pyarrow everything is read from the CSV
+    pa = None
+    feather = None
+
+cleaned_csv = "Statistics/Cleaned_DatasetBio.csv"
+cleaned_cache = "Statistics/Cache/Cleaned_DatasetBio.arrow"
+
+# "GA3 - 698 - B": replicate GA3 of treatment group GA, sample type 698, trip B
+sample_name_pattern = re.compile(
+    r"(?P<Replicate>(?P<Treatment_Group>[A-Za-z]+)\d*)\s*-\s*(?P<Sample_Type>\d{2,3})\s*-\s*(?P<Trip>[A-Za-z])\b"
+)
+control_group = "K"
+
+sample_columns = ["Replicate", "Treatment_Group", "Sample_Type", "Trip_Number"]
+metadata_columns = ["Sample_Number", "Sample_Name", "Control", "Hormone_Treated"] + sample_columns
+
+# Datasets already loaded in this process, keyed by (CSV hash, projected columns)
+_dataset_memo = {}
+
+# Function to parse sample names into categorical columns
+@traced
+def parse_sample_names(names):
+    """
+    Parses "GA3 - 698 - B"-style names into Replicate ("GA3"), Treatment_Group ("GA"),
+    Sample_Type (698), Trip_Number (2, the trip letter's position in the alphabet) and Control.
+    Each distinct name is matched once and rows reuse the result through category codes.
+    Names that do not match get missing values and Control = False.
+    """
+    codes, unique_names = pd.factorize(pd.Series(names))
+    parsed = pd.Series(unique_names, dtype=object).str.extract(sample_name_pattern)
+    parsed["Sample_Type"] = pd.to_numeric(parsed["Sample_Type"]).astype("Int64")
+    parsed["Trip_Number"] = parsed["Trip"].str.upper().map(lambda trip: ord(trip) - ord("A") + 1, na_action="ignore").astype("Int64")
+
+    result = pd.DataFrame(index=pd.RangeIndex(len(codes)))
+    for col in sample_columns:
+        values = parsed[col].astype("category")
+        value_codes = np.append(values.cat.codes.to_numpy(), -1)  # code -1 (missing name) stays missing
+        result[col] = pd.Categorical.from_codes(value_codes[codes], categories=values.cat.categories)
+    result["Control"] = (result["Treatment_Group"] == control_group).to_numpy()
+    return result
+
+# Function to derive the analysis columns from Sample_Name
+def add_sample_columns(df):
+    """
+    Adds the parsed sample-name columns and the Control flag, drops rows without a sample
+    type or trip, and puts the columns in the order of dataset_columns().
+    """
+    parsed = parse_sample_names(df["Sample_Name"])
+    parsed.index = df.index
+    df = df.drop(columns=[col for col in parsed.columns if col in df.columns]).join(parsed)
+    df = df.dropna(subset=["Sample_Type", "Trip_Number"])  # Remove NaN rows
+    for col in ["Sample_Type", "Trip_Number"]:
+        df[col] = df[col].cat.remove_unused_categories()
+        df[col] = df[col].cat.rename_categories(df[col].cat.categories.astype(int))
+    df["Hormone_Treated"] = df["Hormone_Treated"].fillna(False).astype(bool)
+    # Hormones holding only whole numbers are read as integers; analyze them as floats like the others
+    hormone_columns = get_hormone_columns(df)
+    df[hormone_columns] = df[hormone_columns].astype(float)
+    return df[dataset_columns(hormone_columns)]
+
+# Function to list the hormone columns of a cleaned dataset (every numeric column that is not metadata)
+def get_hormone_columns(df):
+    return [col for col in df.columns if col not in metadata_columns
+            and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+
+# Function to list the columns of a typed dataset in their one order, that of the Arrow cache
+def dataset_columns(hormone_columns):
+    return ["Sample_Number", "Sample_Name"] + list(hormone_columns) + ["Control", "Hormone_Treated"] + sample_columns
+
+# Function to fingerprint a file by content
+@traced
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to name the Arrow cache of a cleaned CSV; other CSVs than the default get their own cache
+def cache_path(csv_file=cleaned_csv):
+    if os.path.abspath(csv_file) == os.path.abspath(cleaned_csv):
+        return cleaned_cache
+    location = hashlib.sha256(os.path.abspath(csv_file).encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(os.path.dirname(cleaned_cache), f"{stem}.{location}.arrow")
+
+# Function to check whether the Arrow cache was built from the given CSV contents
+def cache_is_fresh(source_hash, cache_file=cleaned_cache):
+    if feather is None or not os.path.exists(cache_file) or not os.path.exists(cache_file + ".json"):
+        return False
+    with open(cache_file + ".json") as f:
+        return json.load(f).get("source_sha256") == source_hash
+
+class DatasetCacheWriter:
+    """
+    Appends cleaned chunks to the Arrow cache as they are produced.
+    Categories are extended in order of appearance and written as dictionary deltas,
+    so no chunk ever needs the categories of the full dataset. On close, the hash of
+    csv_file is recorded next to the cache. Does nothing without pyarrow.
+    """
+
+    def __init__(self, cache_file=None, csv_file=cleaned_csv):
+        self.cache_file = cache_file or cache_path(csv_file)
+        self.csv_file = csv_file
+        self.writer = None
+        self.schema = None
+        self.categories = {col: [] for col in sample_columns}
+
+    def write(self, chunk):
+        if pa is None:
+            return
+        chunk = add_sample_columns(chunk.copy())
+        for col in sample_columns:
+            known = self.categories[col]
+            known.extend(value for value in chunk[col].cat.categories if value not in known)
+            chunk[col] = chunk[col].cat.set_categories(known)
+
+        if self.writer is None:
+            hormone_columns = get_hormone_columns(chunk)
+            types = {"Sample_Number": pa.string(), "Sample_Name": pa.string(), "Control": pa.bool_(),
+                     "Hormone_Treated": pa.bool_(), "Replicate": pa.dictionary(pa.int32(), pa.string()),
+                     "Treatment_Group": pa.dictionary(pa.int32(), pa.string()),
+                     "Sample_Type": pa.dictionary(pa.int32(), pa.int64()),
+                     "Trip_Number": pa.dictionary(pa.int32(), pa.int64()),
+                     **{col: pa.float64() for col in hormone_columns}}
+            self.schema = pa.schema([pa.field(col, types[col]) for col in dataset_columns(hormone_columns)])
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self.writer = pa.ipc.new_file(self.cache_file, self.schema, options=options)
+
+        chunk = chunk[self.schema.names]
+        self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            with open(self.cache_file + ".json", "w") as f:
+                json.dump({"source_sha256": file_hash(self.csv_file)}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Function to load the cleaned dataset with typed columns
+@traced
+def load_dataset(columns=None, memory_map=True, csv_file=cleaned_csv, cache_file=None):
+    """
+    Returns the cleaned dataset with float hormone columns, categorical sample-name columns
+    (categories sorted) and a boolean Control column.
+    columns restricts the load to the listed columns; memory_map maps the Arrow file
+    instead of reading it into memory first.
+    Results are memoized per CSV hash; a missing or stale cache (by default the cache of
+    csv_file, see cache_path) is rebuilt from the CSV when pyarrow is available.
+    """
+    cache_file = cache_file or cache_path(csv_file)
+    source_hash = file_hash(csv_file)
+    key = (source_hash, None if columns is None else tuple(columns))
+    if key in _dataset_memo:
+        return _dataset_memo[key].copy()
+
+    if cache_is_fresh(source_hash, cache_file):
+        df = feather.read_table(cache_file, columns=columns, memory_map=memory_map).to_pandas()
+    else:
+        df = pd.read_csv(csv_file, delimiter=";")
+        with DatasetCacheWriter(cache_file, csv_file) as cache:
+            cache.write(df)
+        df = add_sample_columns(df)
+        if columns is not None:
+            df = df[columns]
+
+    df = sort_categories(df)
+    _dataset_memo[key] = df
+    return df.copy()
+
+# Function to give the sample-name columns sorted categories
+def sort_categories(df):
+    # Sorted categories keep groupby output in a stable (numeric) order
+    for col in sample_columns:
+        if col in df.columns:
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df.reset_index(drop=True)
+
+# Function to type a cleaned DataFrame that is already in memory, like load_dataset does
+def prepare_dataset(cleaned_df):
+    return sort_categories(add_sample_columns(cleaned_df.copy()))
+
+# Function to read the cleaned CSV in typed chunks, for data too large to load at once
+def iter_dataset_chunks(chunksize, csv_file=cleaned_csv):
+    """
+    Yields chunks of the cleaned dataset with the parsed sample-name columns (see
+    add_sample_columns); categories are those of each chunk.
+    """
+    for chunk in pd.read_csv(csv_file, delimiter=";", chunksize=chunksize):
+        yield add_sample_columns(chunk)
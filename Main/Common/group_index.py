@@ -0,0 +1,153 @@
+"""
+Group index over the hormone values of the cleaned dataset.
+
+The hormone columns are copied once into a contiguous float matrix (samples x hormones) with
+its rows sorted by (Sample_Type, Trip_Number, Control). The rows of each group are then
+contiguous, and offsets[i]:offsets[i + 1] are the rows of the i-th key (CSR layout). Every group
+is a slice of the matrix, a view that costs no copy and no pandas filtering.
+
+The index can be saved as a .npy matrix plus a JSON description (hormones, keys, offsets and the
+hash of the CSV it was built from). load_group_index() memory-maps the saved matrix when it is
+still current and rebuilds it otherwise.
+"""
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from Main.Common.dataset import load_dataset, get_hormone_columns, file_hash, cleaned_csv
+from Main.Common.instrumentation import traced
+
+group_index_file = "Statistics/Cache/group_index.npy"
+
+key_columns = ["Sample_Type", "Trip_Number", "Control"]
+
+class GroupIndex:
+    """
+    values: (samples x hormones) float matrix, rows sorted by group.
+    keys: (Sample_Type, Trip_Number, Control) of every group, in row order.
+    offsets: int array of len(keys) + 1; group i is values[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, values, hormones, keys, offsets, categories=None):
+        self.values = values
+        self.hormones = list(hormones)
+        self.keys = [tuple(key) for key in keys]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        # Category order of Sample_Type and Trip_Number in the dataset the index was built from
+        self.categories = categories or {}
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.columns = {hormone: j for j, hormone in enumerate(self.hormones)}
+        # Groups are sorted by sample type first: the groups of a sample type are a range of positions
+        self.sample_types = {}
+        for i, (sample_type, _, _) in enumerate(self.keys):
+            first, _ = self.sample_types.get(sample_type, (i, i))
+            self.sample_types[sample_type] = (first, i + 1)
+
+    @classmethod
+    @traced(name="GroupIndex.from_dataset")
+    def from_dataset(cls, df):
+        """
+        Builds the index from a typed dataset (see load_dataset). Rows of a group keep their
+        order in df. Rows without a sample type or trip are left out.
+        """
+        hormones = get_hormone_columns(df)
+        codes = [df[col].cat.codes.to_numpy() for col in ["Sample_Type", "Trip_Number"]]
+        control = df["Control"].to_numpy(dtype=bool)
+        valid = (codes[0] >= 0) & (codes[1] >= 0)
+        # lexsort is stable and sorts by its last key first
+        order = np.lexsort((control, codes[1], codes[0]))
+        order = order[valid[order]]
+
+        values = np.ascontiguousarray(df[hormones].to_numpy(dtype=float)[order])
+        sorted_keys = np.column_stack([codes[0][order], codes[1][order], control[order]])
+        starts = np.flatnonzero(np.r_[True, (sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)]) if len(order) else np.array([], dtype=np.int64)
+        offsets = np.r_[starts, len(order)]
+
+        categories = {col: list(df[col].cat.categories) for col in ["Sample_Type", "Trip_Number"]}
+        keys = [(categories["Sample_Type"][type_code], categories["Trip_Number"][trip_code], bool(is_control))
+                for type_code, trip_code, is_control in sorted_keys[starts]]
+        return cls(values, hormones, keys, offsets, categories)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Function to get the rows of one group as a view (no rows when the group is absent)
+    def group(self, sample_type, trip, control):
+        i = self.positions.get((sample_type, trip, bool(control)))
+        if i is None:
+            return self.values[:0]
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    # Function to get the rows of every group of one sample type as one view
+    def sample_type_block(self, sample_type):
+        """
+        Returns (rows, keys, group_of_row): the rows of all groups of sample_type (a view),
+        their keys, and for every row the position of its group in keys.
+        """
+        first, last = self.sample_types.get(sample_type, (0, 0))
+        offsets = self.offsets[first:last + 1] if last > first else self.offsets[:1]
+        rows = self.values[offsets[0]:offsets[-1]]
+        return rows, self.keys[first:last], np.repeat(np.arange(last - first), np.diff(offsets))
+
+    # Function to get one hormone of one group as a view
+    def column(self, sample_type, trip, control, hormone):
+        return self.group(sample_type, trip, control)[:, self.columns[hormone]]
+
+    # Function to number the rows by the group they belong to
+    def group_ids(self):
+        return np.repeat(np.arange(len(self.keys)), np.diff(self.offsets))
+
+    # Function to compute the median of every hormone in every group, ignoring NaN
+    def medians(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN columns give NaN
+            return np.array([np.nanmedian(self.values[start:end], axis=0)
+                             for start, end in zip(self.offsets[:-1], self.offsets[1:])]).reshape(len(self), len(self.hormones))
+
+    # Function to list the keys as a DataFrame (Sample_Type and Trip_Number categorical)
+    def key_frame(self):
+        frame = pd.DataFrame(self.keys, columns=key_columns)
+        for col, categories in self.categories.items():
+            frame[col] = pd.Categorical(frame[col], categories=categories)
+        return frame
+
+    # Function to store the matrix and its description next to each other
+    def save(self, path=group_index_file, source_hash=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(path, self.values)
+        description = {"hormones": self.hormones, "keys": [[int(t), int(trip), c] for t, trip, c in self.keys],
+                       "offsets": self.offsets.tolist(),
+                       "categories": {col: [int(value) for value in values] for col, values in self.categories.items()},
+                       "source_sha256": source_hash}
+        with open(path + ".json", "w") as f:
+            json.dump(description, f)
+
+    @classmethod
+    def load(cls, path=group_index_file, mmap_mode="r"):
+        """
+        Loads a saved index; with mmap_mode (default read-only) the matrix is memory-mapped
+        and groups are read from disk on first access.
+        """
+        with open(path + ".json") as f:
+            description = json.load(f)
+        values = np.load(path, mmap_mode=mmap_mode)
+        return cls(values, description["hormones"], description["keys"], description["offsets"],
+                   description["categories"])
+
+# Function to check whether the saved index was built from the given CSV contents
+def index_is_fresh(source_hash, path=group_index_file):
+    if not os.path.exists(path) or not os.path.exists(path + ".json"):
+        return False
+    with open(path + ".json") as f:
+        return json.load(f).get("source_sha256") == source_hash
+
+# Function to get the group index of the cleaned dataset, memory-mapped when saved earlier
+@traced
+def load_group_index(csv_file=cleaned_csv, path=group_index_file):
+    source_hash = file_hash(csv_file)
+    if index_is_fresh(source_hash, path):
+        return GroupIndex.load(path)
+    index = GroupIndex.from_dataset(load_dataset(csv_file=csv_file))
+    index.save(path, source_hash)
+    return index
@@ -0,0 +1,65 @@
+"""
+Incremental re-analysis support.
+
+Results are stored per (Sample_Type, Trip_Number) group together with a fingerprint of the
+group's input rows. On the next run only groups whose fingerprint changed (or that are new)
+are recomputed; the rest of the table is taken from the store.
+"""
+import hashlib
+import os
+import pandas as pd
+
+store_dir = "Statistics/Cache/Incremental"
+
+# Function to fingerprint the input rows of every group
+def group_fingerprints(df, columns, keys=("Sample_Type", "Trip_Number")):
+    """
+    Returns a dict mapping each observed group key to a hash of the group's rows over the
+    given columns. Row order inside a group does not change the fingerprint, the column
+    names do.
+    """
+    keys = list(keys)
+    rows = df[keys].copy()
+    rows["_row_hash"] = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    rows = rows.sort_values(keys + ["_row_hash"])
+
+    salt = ",".join(map(str, columns)).encode()
+    hashes = rows.groupby(keys, observed=True, sort=False)["_row_hash"].agg(
+        lambda h: hashlib.sha256(salt + h.to_numpy().tobytes()).hexdigest()
+    )
+    return {key if isinstance(key, tuple) else (key,): value for key, value in hashes.items()}
+
+# Function to load the fingerprints and results of the previous run
+def load_group_store(name, version):
+    """
+    Returns (fingerprints, results) stored under name, or ({}, None) when there is no store
+    or it was written by a different version of the analysis.
+    """
+    path = os.path.join(store_dir, f"{name}.pkl")
+    if not os.path.exists(path):
+        return {}, None
+    store = pd.read_pickle(path)
+    if store.get("version") != version:
+        return {}, None
+    return store["fingerprints"], store["results"]
+
+# Function to store the fingerprints and merged results for the next run
+def save_group_store(name, version, fingerprints, results):
+    os.makedirs(store_dir, exist_ok=True)
+    pd.to_pickle({"version": version, "fingerprints": fingerprints, "results": results},
+                 os.path.join(store_dir, f"{name}.pkl"))
+
+# Function to list the groups that have to be recomputed
+def changed_groups(fingerprints, previous):
+    return [key for key, fingerprint in fingerprints.items() if previous.get(key) != fingerprint]
+
+# Function to select stored result rows that can be reused as they are
+def reusable_rows(results, key_columns, fingerprints, changed):
+    """
+    Returns the rows of the stored results whose group still exists and is unchanged.
+    """
+    if results is None:
+        return None
+    unchanged = [key for key in fingerprints if key not in set(changed)]
+    stored_keys = pd.MultiIndex.from_frame(results[list(key_columns)])
+    return results[stored_keys.isin(unchanged)]
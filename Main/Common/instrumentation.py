@@ -0,0 +1,148 @@
+"""
+Opt-in timing and memory instrumentation.
+
+Set BIO_TRACE=<path> (or BIO_TRACE=1 for the default path), or pass --trace to a script, and
+every stage and hot function wrapped in span() or @traced records its wall time, CPU time and
+the peak RSS of the process. At exit the events are written as a Chrome trace (JSON) that can
+be opened in chrome://tracing or https://ui.perfetto.dev; per-name call counts and totals are
+printed and stored in the trace as well.
+
+When tracing is off, span() and @traced only check a flag, so they can stay in hot code.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, peak RSS is left out there
+    resource = None
+
+trace_variable = "BIO_TRACE"
+default_trace_file = "Statistics/Cache/trace.json"
+
+enabled = False
+trace_file = None
+events = []
+_no_span = nullcontext()
+
+# Function to read the peak resident set size of this process in MB
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+# Function to switch tracing on for this process and the processes it starts
+def enable(path=default_trace_file):
+    global enabled, trace_file
+    if path in ("1", "true", "yes"):
+        path = default_trace_file
+    if not enabled:
+        atexit.register(write_trace)
+    enabled, trace_file = True, path
+    os.environ[trace_variable] = path  # Inherited by worker processes
+
+# Function to register the tracing option on a script's argument parser
+def add_trace_argument(parser):
+    parser.add_argument("--trace", nargs="?", const=default_trace_file, metavar="PATH",
+                        help=f"record timings and memory to a Chrome trace file (default: {default_trace_file})")
+
+# Function to turn tracing on from parsed arguments
+def enable_from_args(args):
+    if args.trace:
+        enable(args.trace)
+
+# Function to time a block of code as one trace event
+def span(name, category="function", **details):
+    """
+    Context manager recording name as a complete ("X") event with wall time, CPU time and
+    peak RSS; details are stored as event arguments. Does nothing when tracing is off.
+    """
+    if not enabled:
+        return _no_span
+    return _record(name, category, details)
+
+@contextmanager
+def _record(name, category, details):
+    wall_start, cpu_start = time.perf_counter_ns(), time.process_time_ns()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter_ns() - wall_start, time.process_time_ns() - cpu_start
+        events.append({
+            "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": wall_start / 1000, "dur": wall / 1000,
+            "args": {"cpu_ms": cpu / 1e6, "peak_rss_mb": peak_rss_mb(), **details},
+        })
+
+# Decorator to trace every call of a function
+def traced(func=None, name=None, category="function"):
+    if func is None:
+        return functools.partial(traced, name=name, category=category)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        with _record(label, category, {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+# Function to run a call in a worker process and hand its events back to the parent
+def call_collecting(func, *args):
+    """
+    Returns (result, events recorded during the call). Worker processes do not write trace
+    files themselves; the parent passes the events to merge().
+    """
+    start = len(events)
+    result = func(*args)
+    collected = events[start:]
+    del events[start:]
+    return result, collected
+
+def merge(collected):
+    events.extend(collected)
+
+# Function to aggregate the events per name
+def summarize():
+    summary = {}
+    for event in events:
+        entry = summary.setdefault(event["name"], {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "peak_rss_mb": None})
+        entry["calls"] += 1
+        entry["wall_ms"] += event["dur"] / 1000
+        entry["cpu_ms"] += event["args"]["cpu_ms"]
+        rss = event["args"]["peak_rss_mb"]
+        if rss is not None:
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0, rss)
+    return summary
+
+# Function to write the Chrome trace and print the per-name totals
+def write_trace(path=None):
+    path = path or trace_file
+    if not events or path is None:
+        return
+    summary = summarize()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"summary": summary}}, f)
+
+    print(f"\n{'Traced':<40}{'calls':>8}{'wall ms':>12}{'cpu ms':>12}{'peak RSS MB':>14}")
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["wall_ms"]):
+        rss = "" if entry["peak_rss_mb"] is None else f"{entry['peak_rss_mb']:.1f}"
+        print(f"{name:<40}{entry['calls']:>8}{entry['wall_ms']:>12.1f}{entry['cpu_ms']:>12.1f}{rss:>14}")
+    print(f"Trace written to {path}")
+    events.clear()
+
+# Tracing requested through the environment (also how worker processes inherit it)
+if os.environ.get(trace_variable):
+    enable(os.environ[trace_variable])
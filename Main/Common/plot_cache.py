@@ -0,0 +1,97 @@
+"""
+Content-addressed cache of the per-hormone figures.
+
+Every figure gets a key: a hash of the data slice it is drawn from, its plot parameters, the
+source of the script that draws it and of the Main modules that script imports (see
+code_hash), and the versions of the plotting libraries. The keys of the figures on disk are
+kept in a manifest (.plot_manifest.json) next to the PNGs; a figure whose key is unchanged
+and whose file still exists is not rendered again.
+"""
+import hashlib
+import inspect
+import json
+import os
+from importlib import metadata
+import pandas as pd
+from Main.Common.rendering import render_figures
+from Main.Common.scripts import code_hash
+
+manifest_name = ".plot_manifest.json"
+versioned_libraries = ["matplotlib", "seaborn", "pandas", "numpy"]
+
+# Function to list the library versions that affect how a figure looks
+def library_versions():
+    versions = {}
+    for library in versioned_libraries:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+# Function to compute the key of one figure
+def figure_key(data, params=None, context=None):
+    """
+    Hashes the data slice (values, column names and dtypes), params and context (the code
+    and library versions, see render_changed_figures).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"columns": [str(col) for col in data.columns], "dtypes": [str(dtype) for dtype in data.dtypes],
+                              "params": params, "context": context}, sort_keys=True, default=str).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class PlotManifest:
+    """
+    Keys of the figures in one plot directory, by file name.
+    """
+
+    def __init__(self, plot_dir):
+        self.path = os.path.join(plot_dir, manifest_name)
+        self.keys = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.keys = json.load(f)
+
+    def is_current(self, plot_path, key):
+        return self.keys.get(os.path.basename(plot_path)) == key and os.path.exists(plot_path)
+
+    def record(self, plot_path, key):
+        self.keys[os.path.basename(plot_path)] = key
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.keys, f, indent=2, sort_keys=True)
+
+# Function to render only the figures whose data, parameters or code changed
+def render_changed_figures(render_figure, hormones, plot_path, data_for, params=None, force=False, **render_kwargs):
+    """
+    plot_path(hormone) is the PNG render_figure(hormone) writes and data_for(hormone) the
+    DataFrame slice it is drawn from; params holds everything else that changes the figure.
+    force renders every figure. Other arguments are passed on to render_figures.
+    Returns the failures dict of render_figures.
+    """
+    hormones = list(hormones)
+    # The drawing script and the Main.Common helpers it draws with (templates, box summaries, ...)
+    context = {"code": code_hash(inspect.getsourcefile(render_figure)), "libraries": library_versions()}
+    keys = {hormone: figure_key(data_for(hormone), params, context) for hormone in hormones}
+
+    manifests = {}
+    stale = []
+    for hormone in hormones:
+        path = plot_path(hormone)
+        directory = os.path.dirname(path)
+        if directory not in manifests:
+            manifests[directory] = PlotManifest(directory)
+        if force or not manifests[directory].is_current(path, keys[hormone]):
+            stale.append(hormone)
+    print(f"{len(hormones) - len(stale)} of {len(hormones)} figures unchanged")
+
+    failures = render_figures(render_figure, stale, **render_kwargs) if stale else {}
+    for hormone in stale:
+        if hormone not in failures:
+            manifests[os.path.dirname(plot_path(hormone))].record(plot_path(hormone), keys[hormone])
+    for manifest in manifests.values():
+        manifest.save()
+    return failures
@@ -0,0 +1,86 @@
+"""
+Reusable figure templates for the per-hormone charts.
+
+Only the data changes from one hormone to the next, so the figure, axes, legends and
+styling are built once. FigureTemplate remembers every artist that exists after setup and
+reset() removes only what was drawn afterwards (the data); GroupedBars goes further and
+keeps its bars, changing just their heights. The layout is recomputed on every save, as tick
+labels and titles differ in width from one hormone to the next.
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from Main.Common.instrumentation import span
+
+class FigureTemplate:
+    """
+    A figure built once and reused for every hormone.
+    Call freeze() after adding the static parts (styling, legends, reference lines).
+    """
+
+    def __init__(self, nrows=1, ncols=1, **subplot_kwargs):
+        self.fig, axes = plt.subplots(nrows, ncols, **subplot_kwargs)
+        self.axes = list(np.atleast_1d(axes).ravel())
+        self.static_artists = {}
+        self.initial_layout = {key: getattr(self.fig.subplotpars, key)
+                               for key in ["left", "bottom", "right", "top", "wspace", "hspace"]}
+
+    def freeze(self):
+        self.static_artists = {ax: set(ax.get_children()) for ax in self.axes}
+
+    def reset(self):
+        # Remove the data artists of the previous hormone, keep everything built at setup
+        for ax in self.axes:
+            for artist in ax.get_children():
+                if artist not in self.static_artists.get(ax, ()):
+                    artist.remove()
+
+    def save(self, path, **savefig_kwargs):
+        # Laid out from the initial subplot parameters, as a new figure would be: tight_layout
+        # depends on where it starts (e.g. legends placed below the axes), and the PNG must not
+        # depend on the hormones drawn before. Cheap next to savefig.
+        with span("tight_layout", category="figure"):
+            self.fig.subplots_adjust(**self.initial_layout)
+            self.fig.tight_layout()
+        with span("savefig", category="figure"):
+            self.fig.savefig(path, **savefig_kwargs)
+
+    def close(self):
+        plt.close(self.fig)
+
+class GroupedBars:
+    """
+    Grouped bar chart with x_values along the x-axis and one bar per hue value in each
+    group, like sns.barplot(x=..., hue=...). The bars are created once; update() only
+    sets their heights and the y-limits.
+    """
+
+    def __init__(self, ax, x_values, hue_values, colors, width=0.8, saturation=0.75):
+        self.ax = ax
+        self.hue_values = list(hue_values)
+        bar_width = width / len(self.hue_values)
+        positions = np.arange(len(x_values))
+
+        self.containers = []
+        for i, (hue, color) in enumerate(zip(self.hue_values, colors)):
+            offsets = positions - width / 2 + bar_width * (i + 0.5)
+            self.containers.append(ax.bar(offsets, np.zeros(len(x_values)), bar_width,
+                                          color=sns.desaturate(color, saturation), label=str(hue)))
+        ax.set_xticks(positions, [str(x) for x in x_values])
+        ax.set_xlim(-0.5, len(x_values) - 0.5)
+        ax.xaxis.grid(False)  # Categorical axis, as in seaborn
+
+    def update(self, heights, scale_y=True, floor=0):
+        """
+        heights is a (hue values x x values) array; missing values draw no bar.
+        scale_y=False leaves the y-limits to the caller (e.g. for shared y-axes); floor is the
+        lowest top of the y-axis, e.g. to keep a threshold line in view.
+        """
+        heights = np.asarray(heights, dtype=float)
+        for container, row in zip(self.containers, heights):
+            for rect, height in zip(container, row):
+                rect.set_height(0 if np.isnan(height) else height)
+
+        if scale_y:
+            top = max(np.nanmax(heights) if np.isfinite(heights).any() else 1, floor)
+            self.ax.set_ylim(0, top * 1.05 if top > 0 else 1)
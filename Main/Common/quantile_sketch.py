@@ -0,0 +1,105 @@
+"""
+Mergeable quantile sketches for descriptive statistics of very large groups.
+
+A sketch keeps, for every cell (e.g. hormone x sample type x trip x control), the number of
+values in logarithmic buckets instead of the values themselves (DDSketch). With relative
+accuracy a, bucket i holds the values in (g**(i-1), g**i] with g = (1 + a) / (1 - a), and
+2 * g**i / (g + 1) is within a relative error of a of every value in it. Quantiles are read
+like numpy's default, interpolating between the values of the ranks around q * (n - 1), and
+are within a relative error of a of the exact quantile (for values of one sign).
+Negative values use mirrored buckets and zeros are counted apart. Min and max are exact.
+
+Sketches are built chunk by chunk and are exactly mergeable: merging the sketches of two
+parts of the data gives the same sketch as one pass over all of it. The memory needed grows
+with the spread of the values (log(max / min) / log(g) buckets per cell), not with their number.
+"""
+import numpy as np
+import pandas as pd
+
+default_accuracy = 0.01
+
+class QuantileSketch:
+    """
+    Sketches of every cell identified by the key columns. add() takes values in long format
+    (the key columns plus a "Value" column); NaN values are not counted, but their cells exist.
+    """
+
+    def __init__(self, keys, relative_accuracy=default_accuracy):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.keys = list(keys)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.cells = None  # count, min and max per cell
+        self.buckets = None  # counts per (cell, Sign, Bucket)
+
+    # Function to add values to the sketch
+    def add(self, long_df):
+        # Plain key values, so chunks with different categories line up
+        frame = pd.DataFrame({key: np.asarray(long_df[key]) for key in self.keys})
+        values = long_df["Value"].to_numpy(dtype=float)
+        frame["Value"] = values
+        cells = frame.groupby(self.keys, sort=False)["Value"].agg(["count", "min", "max"])
+
+        valid = ~np.isnan(values)
+        frame = frame[valid].copy()
+        frame["Sign"] = np.sign(values[valid]).astype(np.int64)
+        with np.errstate(divide="ignore"):
+            buckets = np.ceil(np.log(np.abs(values[valid])) / np.log(self.gamma))
+        frame["Bucket"] = np.where(frame["Sign"] == 0, 0, buckets).astype(np.int64)
+        self._combine(cells, frame.groupby(self.keys + ["Sign", "Bucket"], sort=False).size())
+        return self
+
+    # Function to merge the sketch of another part of the data into this one
+    def merge(self, other):
+        if other.keys != self.keys or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("only sketches with the same keys and accuracy can be merged")
+        if other.cells is not None:
+            self._combine(other.cells, other.buckets)
+        return self
+
+    def _combine(self, cells, buckets):
+        if self.cells is None:
+            self.cells, self.buckets = cells, buckets
+            return
+        levels = list(range(len(self.keys)))
+        self.cells = pd.concat([self.cells, cells]).groupby(level=levels, sort=False).agg(
+            {"count": "sum", "min": "min", "max": "max"})
+        self.buckets = self.buckets.add(buckets, fill_value=0).astype(np.int64)
+
+    # Function to read quantiles of every cell from the sketch
+    def quantiles(self, quantiles):
+        """
+        Returns a DataFrame indexed by cell with one column per quantile; 0 and 1 give the
+        exact min and max, cells without values give NaN.
+        """
+        cells = self.cells if self.cells is not None else pd.DataFrame(columns=["count", "min", "max"])
+        result = pd.DataFrame(index=cells.index, columns=list(quantiles), dtype=float)
+        if self.buckets is None or not len(self.buckets):
+            return result
+
+        # Buckets in value order within every cell, with the count of values up to each bucket
+        counts = self.buckets.rename("n").reset_index()
+        counts["Order"] = counts["Sign"] * counts["Bucket"]
+        counts = counts.sort_values(self.keys + ["Sign", "Order"]).reset_index(drop=True)
+        counts["Cumulative"] = counts.groupby(self.keys, sort=False)["n"].cumsum()
+        cell_stats = cells.reindex(pd.MultiIndex.from_frame(counts[self.keys]) if len(self.keys) > 1
+                                   else pd.Index(counts[self.keys[0]]))
+        estimates = counts["Sign"] * 2 * self.gamma ** counts["Bucket"].astype(float) / (self.gamma + 1)
+        estimates = estimates.clip(cell_stats["min"].to_numpy(), cell_stats["max"].to_numpy())
+
+        # Estimate of the value of a given rank (per cell, aligned with cells) from its bucket
+        def value_at(ranks):
+            reached = counts["Cumulative"].to_numpy() > ranks.reindex(cell_stats.index).to_numpy()
+            first = counts[reached].groupby(self.keys, sort=False).head(1).index
+            return pd.Series(estimates.loc[first].to_numpy(), index=cell_stats.index[first]).reindex(cells.index)
+
+        for q in quantiles:
+            if q <= 0 or q >= 1:
+                result[q] = cells["min" if q <= 0 else "max"]
+                continue
+            # Linear interpolation between the values of the neighbouring ranks, as numpy's default
+            rank = q * (cells["count"] - 1)
+            lower, upper = value_at(np.floor(rank)), value_at(np.ceil(rank))
+            result[q] = lower + (upper - lower) * (rank - np.floor(rank))
+        return result
@@ -0,0 +1,125 @@
+"""
+Rank-once statistics core.
+
+Mann-Whitney U, Cliff's delta and Kruskal-Wallis H are all functions of ranks. rank_partitions()
+sorts every column of a block once and derives from that single sort the average ranks within
+the groups of any number of partitions of the rows, together with each group's size and tie
+term. The test functions below work on those ranks rather than on the values, so a block that
+is tested in several ways is still sorted only once.
+
+Results follow scipy.stats (average ranks, tie correction, continuity correction for the normal
+approximation of U); scipy.special is imported only when a p-value is computed.
+"""
+import numpy as np
+
+# Function to rank the columns of a block within the groups of one or more partitions, from one sort
+def rank_partitions(values, *partitions):
+    """
+    values: (rows x columns) array, NaN for missing values. Every partition is an int array
+    with the group (0 .. groups - 1) of each row.
+    Returns a (ranks, counts, tie_terms) tuple per partition:
+    ranks (rows x columns) are the average ranks among the non-missing values of the row's
+    group (NaN where missing); counts and tie_terms (groups x columns) are the number of
+    non-missing values and sum(t**3 - t) over the runs of t tied values of every group.
+    """
+    values = np.asarray(values, dtype=float)
+    n_rows, n_columns = values.shape
+    order = np.argsort(values, axis=0, kind="stable")  # The one sort; NaN sorts last
+    sorted_values = np.take_along_axis(values, order, axis=0)
+
+    # Runs of equal values in every sorted column
+    new_run = np.ones(values.shape, dtype=bool)
+    new_run[1:] = sorted_values[1:] != sorted_values[:-1]
+    runs = np.cumsum(new_run, axis=0) - 1
+
+    # The non-missing values, column by column in sorted order
+    entries = np.flatnonzero(~np.isnan(sorted_values.T))
+    columns, entry_runs = entries // n_rows, runs.T.ravel()[entries]
+
+    results = []
+    for labels in partitions:
+        labels = np.asarray(labels, dtype=np.int64)
+        n_groups = int(labels.max()) + 1 if len(labels) else 0
+        group_key = columns * n_groups + labels[order].T.ravel()[entries]
+
+        # Grouping the entries by (column, group) keeps them in sorted order within each group,
+        # so an entry's offset from the start of its group is its position among the group's values
+        grouped = np.argsort(group_key, kind="stable")
+        keys, key_runs = group_key[grouped], entry_runs[grouped]
+        counts = np.bincount(group_key, minlength=n_columns * n_groups)
+        position = np.arange(len(keys)) - (np.cumsum(counts) - counts)[keys]
+
+        # Tied values of a group have consecutive positions; their rank is the mean position + 1
+        new_tie = np.ones(len(keys), dtype=bool)
+        new_tie[1:] = (keys[1:] != keys[:-1]) | (key_runs[1:] != key_runs[:-1])
+        ties = np.cumsum(new_tie) - 1
+        size = np.bincount(ties)
+        position_sum = np.bincount(ties, weights=position, minlength=len(size))
+        entry_ranks = np.empty(len(entries))
+        entry_ranks[grouped] = position_sum[ties] / size[ties] + 1
+        sorted_ranks = np.full(n_columns * n_rows, np.nan)
+        sorted_ranks[entries] = entry_ranks
+
+        ranks = np.empty(values.shape)
+        np.put_along_axis(ranks, order, sorted_ranks.reshape(n_columns, n_rows).T, axis=0)
+        tie_terms = np.zeros(n_columns * n_groups, dtype=np.int64)
+        np.add.at(tie_terms, keys[new_tie], size ** 3 - size)
+        results.append((ranks, counts.reshape(n_columns, n_groups).T, tie_terms.reshape(n_columns, n_groups).T))
+    return results
+
+# Function to sum the non-missing values (ranks or indicators) of every group of rows
+def group_sums(values, groups, n_groups):
+    """
+    Returns the (groups x columns) sums; missing values count as 0.
+    """
+    member = np.asarray(groups)[None, :] == np.arange(n_groups)[:, None]
+    return member.astype(float) @ np.nan_to_num(np.asarray(values, dtype=float))
+
+# Function to get Mann-Whitney U of x from the rank sum of x
+def mann_whitney_u(rank_sum_x, nx):
+    return rank_sum_x - nx * (nx + 1) / 2
+
+# Function to compute two-sided normal-approximation p-values of U
+def mann_whitney_asymptotic_p(u_x, nx, ny, tie_terms):
+    """
+    scipy's method="asymptotic" with the tie and continuity corrections; tie_terms is
+    sum(t**3 - t) over the tied values of the combined sample.
+    """
+    from scipy.special import ndtr
+    n = nx + ny
+    u_larger = np.maximum(u_x, nx * ny - u_x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.sqrt(nx * ny / 12 * ((n + 1) - tie_terms / (n * (n - 1))))
+        z = (u_larger - nx * ny / 2 - 0.5) / s
+    return np.clip(2 * ndtr(-z), 0, 1)
+
+# Function to compute Cliff's delta from U
+def cliffs_delta_from_u(u_x, nx, ny):
+    """
+    U = #(x > y) + 0.5 * #(x == y), so 2U - nx*ny = #(x > y) - #(x < y). Returns NaN where
+    either sample is empty.
+    """
+    empty = (nx == 0) | (ny == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = (2 * u_x - nx * ny) / np.where(empty, 1, nx * ny)
+    return np.where(empty, np.nan, delta)
+
+# Function to compute the Kruskal-Wallis test from group rank sums
+def kruskal_wallis(rank_sums, counts, tie_terms):
+    """
+    rank_sums and counts are (groups x columns), with the ranks taken over all groups
+    together; tie_terms (columns) is sum(t**3 - t) over the tied values of all groups.
+    Groups without values are left out. Returns H (tie corrected), degrees of freedom and
+    p-values per column, as scipy.stats.kruskal; NaN where fewer than two groups have values
+    or every value is tied.
+    """
+    from scipy.special import chdtrc
+    counts = np.asarray(counts)
+    n = counts.sum(axis=0)
+    groups = (counts > 0).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = np.where(counts > 0, rank_sums ** 2 / np.where(counts > 0, counts, 1), 0).sum(axis=0)
+        h = 12 / (n * (n + 1)) * between - 3 * (n + 1)
+        h = h / (1 - tie_terms / (n ** 3 - n))
+    h = np.where(groups >= 2, h, np.nan)
+    return h, groups - 1, chdtrc(groups - 1, h)
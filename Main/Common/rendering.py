@@ -0,0 +1,71 @@
+"""
+Parallel rendering of per-hormone figures.
+
+Each figure is drawn by a top-level render function of the calling script, which takes a
+hormone name and saves one PNG. The data a render function needs is installed by a setup
+function (e.g. set_plot_data(df)); with more than one worker the figures are rendered in a
+process pool on the headless Agg backend, the setup runs once per worker and only the
+hormone name is sent for each figure.
+"""
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Main.Common.instrumentation import span, call_collecting, merge
+
+# Function to switch a worker process to the non-interactive backend
+def use_agg_backend():
+    import matplotlib
+    matplotlib.use("Agg")
+
+# Function to prepare a worker process: headless backend plus the script's plot data
+def init_worker(setup, setup_args):
+    use_agg_backend()
+    if setup is not None:
+        setup(*setup_args)
+
+# Function to render one figure as a traced step
+def render_one(render_figure, hormone):
+    with span("render_figure", category="figure", hormone=hormone):
+        render_figure(hormone)
+
+# Function to register the worker-count option on a script's argument parser
+def add_worker_argument(parser):
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes for rendering (default: number of CPUs, 1 = serial)")
+
+# Function to render one figure per hormone, serially or in a process pool
+def render_figures(render_figure, hormones, workers=None, setup=None, setup_args=()):
+    """
+    Calls render_figure(hormone) for every hormone, after setup(*setup_args) has run in
+    the rendering process. A failing figure is reported with its traceback and does not
+    stop the others.
+    Returns a dict mapping each failed hormone to its error message.
+    """
+    hormones = list(hormones)
+    workers = min(workers or os.cpu_count() or 1, max(len(hormones), 1))
+    failures = {}
+
+    if workers == 1:
+        if setup is not None:
+            setup(*setup_args)
+        for hormone in hormones:
+            try:
+                render_one(render_figure, hormone)
+            except Exception as error:
+                failures[hormone] = f"{error!r}\n{traceback.format_exc()}"
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(setup, setup_args)) as pool:
+            # Trace events recorded in the workers come back with each figure
+            futures = {pool.submit(call_collecting, render_one, render_figure, hormone): hormone
+                       for hormone in hormones}
+            for future in as_completed(futures):
+                try:
+                    merge(future.result()[1])
+                except Exception as error:
+                    failures[futures[future]] = f"{error!r}\n{''.join(traceback.format_exception(error))}"
+
+    for hormone, error in failures.items():
+        print(f"Failed to render figure for {hormone}: {error}")
+    print(f"Rendered {len(hormones) - len(failures)} of {len(hormones)} figures")
+    return failures
@@ -0,0 +1,134 @@
+"""
+Bootstrap confidence intervals and permutation p-values of Cliff's delta.
+
+All replicates of one (control, treated) pair are drawn at once: a (resamples x n) index
+matrix for the bootstrap and a (resamples x n) membership matrix for the permutations, and
+the statistic is evaluated for every replicate in one matrix product:
+- The bootstrap uses the pair's sign matrix sign(x_i - y_j). A replicate's dominance count is
+  counts_x @ sign @ counts_y, where counts are how often each value was drawn.
+- A permutation's dominance count is the sum over the values assigned to x of their dominance
+  over the pooled sample. The pairs within x cancel, because the sign matrix is antisymmetric.
+When a pair has no more distinct splits than the number of resamples, every split is enumerated
+and the permutation p-value is exact.
+
+Pair i draws from its own stream, SeedSequence(seed, spawn_key=(i,)), the i-th child of the
+seed. Results therefore depend only on the seed and the order of the pairs, not on how the pairs
+are split over worker processes.
+"""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Main.Common.instrumentation import traced, call_collecting, merge
+
+default_resamples = 10000
+confidence_level = 0.95
+
+# Pairs handed to a worker process at a time
+chunk_size = 256
+
+# Function to get the random stream of one pair
+def pair_stream(seed, number):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(number,)))
+
+# Function to compute the Cliff's delta of bootstrap replicates of one pair
+def bootstrap_cliffs_delta(x, y, rng, resamples=default_resamples):
+    """
+    Resamples x and y with replacement. Returns the delta of every replicate.
+    """
+    nx, ny = len(x), len(y)
+    sign = np.sign(x[:, None] - y[None, :])
+    # One index matrix per sample, turned into per-value draw counts
+    index_x = rng.integers(0, nx, size=(resamples, nx)) + nx * np.arange(resamples)[:, None]
+    index_y = rng.integers(0, ny, size=(resamples, ny)) + ny * np.arange(resamples)[:, None]
+    counts_x = np.bincount(index_x.ravel(), minlength=resamples * nx).reshape(resamples, nx)
+    counts_y = np.bincount(index_y.ravel(), minlength=resamples * ny).reshape(resamples, ny)
+    return ((counts_x @ sign) * counts_y).sum(axis=1) / (nx * ny)
+
+# Membership matrices of every split, by (n, nx); pairs of the same sizes share them
+_splits = {}
+
+# Function to list every way of choosing nx of n values as a membership matrix
+def all_splits(n, nx):
+    if (n, nx) not in _splits:
+        members = np.zeros((math.comb(n, nx), n), dtype=bool)
+        for i, chosen in enumerate(itertools.combinations(range(n), nx)):
+            members[i, list(chosen)] = True
+        _splits[(n, nx)] = members
+    return _splits[(n, nx)]
+
+# Function to compute the dominance count (#(x > y) - #(x < y)) of permuted splits of one pair
+def permutation_dominance(x, y, rng, resamples=default_resamples):
+    """
+    Returns (dominance of every split, whether all splits were enumerated). Random splits do
+    not include the observed one.
+    """
+    nx, n = len(x), len(x) + len(y)
+    pooled = np.concatenate((x, y))
+    dominance = np.sign(pooled[:, None] - pooled[None, :]).sum(axis=1)
+
+    exact = math.comb(n, nx) <= resamples
+    if exact:
+        members = all_splits(n, nx)
+    else:
+        # The nx smallest of n uniform draws pick a random subset of size nx
+        draws = rng.random((resamples, n))
+        members = draws <= np.partition(draws, nx - 1, axis=1)[:, nx - 1:nx]
+    return members.astype(float) @ dominance, exact
+
+# Function to resample one pair
+@traced
+def resample_pair(x, y, rng, resamples=default_resamples, level=confidence_level):
+    """
+    Returns Cliff's delta, the percentile bootstrap interval at the given level, the two-sided
+    permutation p-value and whether that p-value is exact. NaN values are ignored.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x, y = x[~np.isnan(x)], y[~np.isnan(y)]
+    if len(x) == 0 or len(y) == 0:
+        return np.nan, np.nan, np.nan, np.nan, False
+
+    observed = np.sign(x[:, None] - y[None, :]).sum()
+    delta = observed / (len(x) * len(y))
+    tail = (1 - level) / 2
+    low, high = np.quantile(bootstrap_cliffs_delta(x, y, rng, resamples), [tail, 1 - tail])
+
+    # Dominance counts are integers, so "at least as extreme" is compared exactly
+    permuted, exact = permutation_dominance(x, y, rng, resamples)
+    extreme = np.count_nonzero(np.abs(permuted) >= abs(observed))
+    p_value = extreme / len(permuted) if exact else (extreme + 1) / (len(permuted) + 1)
+    return delta, low, high, p_value, exact
+
+# Function to resample a run of pairs (runs in a worker process)
+def resample_chunk(pairs, first_number, seed, resamples, level):
+    return [resample_pair(x, y, pair_stream(seed, first_number + i), resamples, level)
+            for i, (x, y) in enumerate(pairs)]
+
+# Function to resample many pairs, serially or in a process pool
+@traced
+def resample_pairs(pairs, resamples=default_resamples, seed=0, workers=None, level=confidence_level):
+    """
+    pairs is a list of (x, y) value arrays. Returns a (pairs x 4) float array of delta,
+    interval low, interval high and permutation p-value, and a boolean array that is True
+    where the p-value is exact. Results do not depend on workers.
+    """
+    chunks = [(pairs[start:start + chunk_size], start) for start in range(0, len(pairs), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+
+    if workers == 1:
+        rows = [row for chunk, start in chunks for row in resample_chunk(chunk, start, seed, resamples, level)]
+    else:
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(call_collecting, resample_chunk, chunk, start, seed, resamples, level)
+                       for chunk, start in chunks]
+            for future in futures:
+                chunk_rows, events = future.result()
+                merge(events)
+                rows.extend(chunk_rows)
+
+    if not rows:
+        return np.empty((0, 4)), np.empty(0, dtype=bool)
+    return np.array([row[:4] for row in rows], dtype=float), np.array([row[4] for row in rows], dtype=bool)
@@ -0,0 +1,180 @@
+"""
+Indexed SQLite store of the analysis results and their summary.
+
+The results table (Non-Parameteric_Analysis_Results.csv) is keyed on (hormone, sample type,
+trip) and the summary on (hormone, sample type); both also have an index on sample type first.
+The slice of one hormone or one sample type is then read from the index, in milliseconds,
+instead of parsing and masking the whole CSV.
+
+Each table keeps the position of every row in its CSV, so slices come back in the CSV's order,
+and the store records the hash of the CSVs it was built from. load_results_store() opens the
+store when it still matches the CSVs and rebuilds it from them otherwise. "N/A" p-values and
+effect sizes are stored as NULL and read back as NaN.
+"""
+import os
+import sqlite3
+import pandas as pd
+from Main.Common.dataset import file_hash
+from Main.Common.instrumentation import traced
+
+results_store_file = "Statistics/Cache/analysis_results.sqlite"
+results_csv = "Statistics/Non-Parameteric_Analysis_Results.csv"
+summary_csv = "Statistics/Hormone_Analysis_Summary.csv"
+
+# Table -> CSV column -> SQL column, in the order of the CSV
+table_columns = {
+    "results": {"Trip": "trip", "Sample Type": "sample_type", "Hormone": "hormone", "Control N": "control_n",
+                "Treated N": "treated_n", "p-value": "p_value", "Effect Size": "effect_size",
+                "Effect Category": "effect_category", "Conclusion": "conclusion", "Causation": "causation"},
+    "summary": {"Hormone": "hormone", "Sample Type": "sample_type", "Significant Tests": "significant_tests",
+                "Total Tests": "total_tests", "Significance Ratio": "significance_ratio", "Conclusion": "conclusion"},
+}
+
+# Columns that hold numbers or "N/A" in the CSV
+numeric_columns = {"results": ["p-value", "Effect Size"], "summary": []}
+
+# Sample types and trips have no declared type, so they keep whatever type they had (number or text)
+schema = """
+CREATE TABLE results (
+    position INTEGER NOT NULL, hormone TEXT NOT NULL, sample_type NOT NULL, trip NOT NULL,
+    control_n INTEGER, treated_n INTEGER, p_value REAL, effect_size REAL,
+    effect_category TEXT, conclusion TEXT, causation TEXT,
+    PRIMARY KEY (hormone, sample_type, trip)
+) WITHOUT ROWID;
+CREATE INDEX results_by_sample_type ON results (sample_type, hormone, trip);
+CREATE TABLE summary (
+    position INTEGER NOT NULL, hormone TEXT NOT NULL, sample_type NOT NULL,
+    significant_tests INTEGER, total_tests INTEGER, significance_ratio REAL, conclusion TEXT,
+    PRIMARY KEY (hormone, sample_type)
+) WITHOUT ROWID;
+CREATE INDEX summary_by_sample_type ON summary (sample_type, hormone);
+CREATE TABLE sources (name TEXT PRIMARY KEY, sha256 TEXT);
+"""
+
+class ResultsStore:
+    """
+    Read access to a results store. The connection is opened on first use, so a store can be
+    handed to worker processes.
+    """
+
+    def __init__(self, path=results_store_file):
+        self.path = path
+        self._connection = None
+
+    def __getstate__(self):
+        return {"path": self.path, "_connection": None}
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return self._connection
+
+    # Function to run a query over one table and return its rows under the CSV column names
+    def _select(self, table, hormone=None, sample_type=None, trip_range=None):
+        conditions, parameters = [], []
+        for column, value in [("hormone", hormone), ("sample_type", sample_type)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if trip_range is not None:
+            conditions.append("trip BETWEEN ? AND ?")
+            parameters.extend(trip_range)
+        columns = table_columns[table]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        frame = pd.read_sql_query(f"SELECT {', '.join(columns.values())} FROM {table}{where} ORDER BY position",
+                                  self.connection, params=parameters)
+        frame.columns = list(columns)
+        for col in numeric_columns[table]:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce")
+        return frame
+
+    # Function to get the results of one hormone and/or sample type (all results by default)
+    @traced(name="ResultsStore.results")
+    def results(self, hormone=None, sample_type=None, trip_range=None):
+        """
+        trip_range is an inclusive (first, last) pair of trips. Rows are in the order of the
+        results CSV.
+        """
+        return self._select("results", hormone, sample_type, trip_range)
+
+    # Function to get the summary of one hormone and/or sample type (the whole summary by default)
+    @traced(name="ResultsStore.summary")
+    def summary(self, hormone=None, sample_type=None):
+        return self._select("summary", hormone, sample_type)
+
+    # Function to list the distinct values of a key column, in order of first appearance
+    def _distinct(self, column, trip_range=None):
+        where = " WHERE trip BETWEEN ? AND ?" if trip_range is not None else ""
+        rows = self.connection.execute(f"SELECT {column} FROM results{where} GROUP BY {column} ORDER BY MIN(position)",
+                                       list(trip_range or ())).fetchall()
+        return [value for value, in rows]
+
+    # Function to list the hormones of the results
+    def hormones(self, trip_range=None):
+        return self._distinct("hormone", trip_range)
+
+    # Function to list the sample types of the results
+    def sample_types(self, trip_range=None):
+        return self._distinct("sample_type", trip_range)
+
+    # Function to list the trips of the results
+    def trips(self, trip_range=None):
+        return self._distinct("trip", trip_range)
+
+    # Function to get the hash of the CSV a table was built from
+    def source_hash(self, name):
+        row = self.connection.execute("SELECT sha256 FROM sources WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+# Function to convert a results or summary table to rows of the store
+def _table_rows(table, df):
+    columns = table_columns[table]
+    frame = df[list(columns)].rename(columns=columns)
+    for col in numeric_columns[table]:
+        frame[columns[col]] = pd.to_numeric(df[col], errors="coerce")
+    frame.insert(0, "position", range(len(frame)))
+    # Plain Python values (NaN as NULL), which sqlite3 stores directly
+    return list(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)), list(frame.columns)
+
+# Function to write the results and summary tables to a new store
+@traced
+def save_results_store(results_df, summary_df, path=results_store_file, sources=None):
+    """
+    sources maps "results" and "summary" to the CSVs the tables were written to; their hashes
+    let load_results_store() tell whether the store is still current. The store is written
+    to a temporary file and renamed into place, so readers never see a partial store.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    try:
+        connection.executescript(schema)
+        for table, df in [("results", results_df), ("summary", summary_df)]:
+            rows, columns = _table_rows(table, df)
+            connection.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+        connection.executemany("INSERT INTO sources VALUES (?, ?)",
+                               [(name, file_hash(csv)) for name, csv in (sources or {}).items() if os.path.exists(csv)])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temporary, path)
+    return ResultsStore(path)
+
+# Function to open the results store, rebuilding it when the CSVs changed since it was written
+@traced
+def load_results_store(path=results_store_file, results_file=results_csv, summary_file=summary_csv):
+    sources = {"results": results_file, "summary": summary_file}
+    if os.path.exists(path):
+        store = ResultsStore(path)
+        if all(store.source_hash(name) == file_hash(csv) for name, csv in sources.items()):
+            return store
+        store.close()
+    return save_results_store(pd.read_csv(results_file), pd.read_csv(summary_file), path, sources)
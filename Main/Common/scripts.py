@@ -0,0 +1,67 @@
+"""
+Access to the scripts of the package as modules.
+
+Several scripts have hyphens in their file names (non-parametric-method.py), so they cannot be
+imported with an import statement; importlib loads them by name like any other module.
+Importing a script has no side effects, the work happens in its functions and main().
+
+code_hash() fingerprints a script together with the Main modules it imports, for caches whose
+results must be redone when any of that code changes.
+"""
+import ast
+import hashlib
+import importlib
+import importlib.util
+import os
+
+# Directory that holds the Main package
+package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Function to import a script by its path below Main, e.g. "Analysis.non-parametric-method"
+def load_script(name):
+    return importlib.import_module(f"Main.{name}")
+
+# Function to find the file of a script without importing it (and its dependencies)
+def script_path(name):
+    return importlib.util.find_spec(f"Main.{name}").origin
+
+# Function to find the file of a Main module from its dotted name, without importing it
+def module_path(module):
+    path = os.path.join(package_root, *module.split("."))
+    for candidate in [path + ".py", os.path.join(path, "__init__.py")]:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+# Function to list the files of the Main modules a source file imports
+def imported_files(path):
+    with open(path, "rb") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module and node.module.split(".")[0] == "Main":
+            # "from Main.Common import x" may name modules as well as functions
+            modules += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        elif isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names if alias.name.split(".")[0] == "Main"]
+    return [path for path in map(module_path, modules) if path is not None]
+
+# Function to hash a source file together with every Main module it imports, directly or not
+def code_hash(path):
+    """
+    The imports are found by parsing the sources, so nothing is imported. Modules loaded at
+    run time (load_script) are not followed.
+    """
+    seen, pending = set(), [os.path.abspath(path)]
+    while pending:
+        current = pending.pop()
+        if current not in seen:
+            seen.add(current)
+            pending.extend(os.path.abspath(found) for found in imported_files(current))
+
+    digest = hashlib.sha256()
+    for current in sorted(seen):
+        digest.update(os.path.relpath(current, package_root).encode())
+        with open(current, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
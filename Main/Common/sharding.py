@@ -0,0 +1,217 @@
+"""
+Shards of a work grid, their result files and a file-based work queue.
+
+A grid is a list of cells (e.g. (hormone, sample type) pairs) in a fixed order. Shard i of n
+(1 <= i <= n) holds the cells at positions i - 1, i - 1 + n, i - 1 + 2n, ... so the same grid is
+always split the same way, and neighbouring cells (which tend to cost the same) are spread over
+all shards.
+
+Every shard writes its results as a CSV plus a JSON description: shard number and count, the
+hash of the dataset and the grid it was computed from, and its cells. Both are written to a
+temporary file first and renamed into place, so a shard file that exists is complete.
+
+WorkQueue hands out the shards of a shard directory to any number of worker processes, on one
+machine or on several machines that share the directory. A worker claims a shard by creating
+its claim file with O_CREAT | O_EXCL, which succeeds for exactly one worker; a shard is done
+once its result files exist.
+"""
+import json
+import os
+import socket
+import time
+import pandas as pd
+
+default_shard_dir = "Statistics/Shards"
+
+# Function to parse a "i/n" shard argument
+def parse_shard(text):
+    try:
+        shard, shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must be given as i/n, not {text!r}") from None
+    if not 1 <= shard <= shards:
+        raise ValueError(f"shard {text} is not between 1/{shards} and {shards}/{shards}")
+    return shard, shards
+
+# Function to pick the cells of one shard from the grid
+def shard_cells(cells, shard, shards):
+    return list(cells)[shard - 1::shards]
+
+# Function to name the result files of one shard
+def shard_paths(shard, shards, directory=default_shard_dir):
+    stem = os.path.join(directory, f"shard_{shard:04d}_of_{shards:04d}")
+    return stem + ".csv", stem + ".json"
+
+# Function to write a file via a temporary file, so it appears complete or not at all
+def write_atomically(path, write):
+    temporary = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    write(temporary)
+    os.replace(temporary, path)
+
+# Function to store the results of one shard with its description
+def write_shard(results_df, description, directory=default_shard_dir):
+    """
+    description holds at least "shard", "shards", "source_sha256", "grid" and "cells".
+    The JSON is written last: a shard counts as done once it exists.
+    """
+    csv_path, json_path = shard_paths(description["shard"], description["shards"], directory)
+    os.makedirs(directory, exist_ok=True)
+    write_atomically(csv_path, lambda path: results_df.to_csv(path, index=False))
+
+    def write_description(path):
+        with open(path, "w") as f:
+            json.dump({**description, "rows": len(results_df)}, f, indent=2)
+    write_atomically(json_path, write_description)
+
+# Function to read the description of one shard (None when the shard is not done)
+def read_description(shard, shards, directory=default_shard_dir):
+    _, json_path = shard_paths(shard, shards, directory)
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path) as f:
+        return json.load(f)
+
+# Function to read every shard of a directory back and check that they form one complete run
+def read_shards(directory=default_shard_dir, cell_columns=None):
+    """
+    Reads the result tables as text (every value as written, "N/A" included) and checks that
+    all shards share the shard count, dataset and grid, that none is missing, and that each
+    holds exactly its own cells and the announced number of rows. cell_columns names the
+    result columns that identify a cell, in the order of the cell tuples.
+    Returns (list of result tables in shard order, description of the first shard).
+    Raises ValueError describing every problem found.
+    """
+    descriptions = {}
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if name.startswith("shard_") and name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                description = json.load(f)
+            descriptions[(description["shard"], description["shards"])] = description
+    if not descriptions:
+        raise ValueError(f"no shards found in {directory}")
+
+    counts = sorted({count for _, count in descriptions})
+    if len(counts) > 1:
+        raise ValueError(f"{directory} holds shards of runs with {', '.join(map(str, counts))} shards; "
+                         "remove the files of the runs not to merge")
+
+    problems = []
+    first = descriptions[min(descriptions)]
+    shards = first["shards"]
+    for (shard, count), description in sorted(descriptions.items()):
+        if description["source_sha256"] != first["source_sha256"]:
+            problems.append(f"shard {shard}/{count} was computed from a different dataset than shard {first['shard']}/{shards}")
+        elif description["grid"] != first["grid"]:
+            problems.append(f"shard {shard}/{count} was computed over a different grid than shard {first['shard']}/{shards}")
+    missing = [shard for shard in range(1, shards + 1) if (shard, shards) not in descriptions]
+    if missing:
+        problems.append(f"missing shards: {', '.join(f'{shard}/{shards}' for shard in missing)}")
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    tables = []
+    for shard in range(1, shards + 1):
+        description = descriptions[(shard, shards)]
+        expected = [tuple(cell) for cell in shard_cells(first["grid"]["cells"], shard, shards)]
+        if [tuple(cell) for cell in description["cells"]] != expected:
+            problems.append(f"shard {shard}/{shards} does not hold the cells of its position in the grid")
+        csv_path, _ = shard_paths(shard, shards, directory)
+        table = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+        if len(table) != description["rows"]:
+            problems.append(f"shard {shard}/{shards} has {len(table)} rows instead of {description['rows']}")
+        if cell_columns:
+            found = set(table[cell_columns].itertuples(index=False, name=None))
+            if not found <= {tuple(str(value) for value in cell) for cell in expected}:
+                problems.append(f"shard {shard}/{shards} has results outside its cells")
+        tables.append(table)
+    if problems:
+        raise ValueError("; ".join(problems))
+    return tables, first
+
+class WorkQueue:
+    """
+    The shards of one run, handed out through claim files in directory/claims. Claims older
+    than stale_after seconds (a worker that died) are taken over; with stale_after None they
+    are kept until removed by hand.
+    """
+
+    def __init__(self, shards, directory=default_shard_dir, stale_after=None):
+        self.shards = shards
+        self.directory = directory
+        self.claim_dir = os.path.join(directory, "claims")
+        self.stale_after = stale_after
+        os.makedirs(self.claim_dir, exist_ok=True)
+
+    @classmethod
+    def open(cls, directory=default_shard_dir, shards=None, stale_after=None):
+        """
+        Joins the queue of directory, or starts it with the given number of shards. The first
+        worker fixes the count in directory/queue.json; later workers may leave shards out.
+        """
+        path = os.path.join(directory, "queue.json")
+        os.makedirs(directory, exist_ok=True)
+        if shards is not None:
+            # Linked into place complete, and only if no other worker started the queue first
+            temporary = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                json.dump({"shards": shards}, f)
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary)
+        if not os.path.exists(path):
+            raise ValueError(f"no queue in {directory} yet: give the number of shards to start one")
+        with open(path) as f:
+            queued = json.load(f)["shards"]
+        if shards is not None and shards != queued:
+            raise ValueError(f"the queue in {directory} has {queued} shards, not {shards}")
+        return cls(queued, directory, stale_after)
+
+    def _claim_path(self, shard):
+        return os.path.join(self.claim_dir, f"shard_{shard:04d}_of_{self.shards:04d}.claim")
+
+    # Function to take over a claim that has not been finished in time
+    def _release_stale(self, path):
+        try:
+            if self.stale_after is None or time.time() - os.path.getmtime(path) < self.stale_after:
+                return False
+            # Renaming succeeds for one worker only, the others find the claim gone
+            os.rename(path, f"{path}.{socket.gethostname()}.{os.getpid()}.stale")
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Function to claim the next shard that is neither done nor being worked on
+    def claim(self, is_done):
+        """
+        is_done(shard) tells whether a shard's results already exist. Returns the claimed
+        shard number, or None when every shard is done or claimed.
+        """
+        for shard in range(1, self.shards + 1):
+            if is_done(shard):
+                continue
+            path = self._claim_path(shard)
+            for _ in range(2):
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    if self._release_stale(path):
+                        continue
+                    break
+                with os.fdopen(fd, "w") as f:
+                    f.write(f"{socket.gethostname()} {os.getpid()}\n")
+                # Another worker may have finished the shard between the check and the claim
+                if is_done(shard):
+                    os.remove(path)
+                    break
+                return shard
+        return None
+
+    # Function to release a claim once the shard's results are written (or its run failed)
+    def release(self, shard):
+        try:
+            os.remove(self._claim_path(shard))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,3 @@
+"""
+Plots of the cleaned dataset and the analysis results.
+"""
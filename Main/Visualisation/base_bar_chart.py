@@ -4,54 +4,141 @@ Data visualisation with bar chart no error bars or etcetera
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
+import argparse
+import os
+import sys
 
-# Load cleaned dataset
-df = pd.read_csv("Statistics/Cleaned_DatasetBio.csv", delimiter=";")
-
-# Ensure Trip_Number is treated as an integer
-df["Trip_Number"] = df["Trip_Number"].astype(int)
-
-# Extract numeric part of Sample_Type (removing prefixes like 'K1-' or 'GA1-')
-df["Sample_Type"] = df["Sample_Name"].str.extract(r'(\d{3})')[0]  # Extracts the three-digit number
-
-# Identify control and hormone-treated samples
-df["Control"] = df["Sample_Name"].str.startswith("K")  # Control samples start with "K"
-
-# Group by Trip_Number and Sample_Type, then compute mean hormone content
-grouped_df = df.groupby(["Trip_Number", "Sample_Type", "Control"]).median(numeric_only=True).reset_index()
-
-# Set seaborn style
-sns.set_style("whitegrid")
-
-# Get list of hormone columns (excluding metadata)
-hormone_columns = df.columns[2:-4]  # Adjust index slicing as needed
-
-# Define distinct colors for better clarity
-color_palette = sns.color_palette("tab10", n_colors=len(grouped_df["Sample_Type"].unique()))
-
-# Loop through each hormone and create separate subplots
-for hormone in hormone_columns:
-    fig, axes = plt.subplots(1, 2, figsize=(16, 6), sharey=True)  # Two subplots side by side
-    
-    # Separate control and treated data
-    control_data = grouped_df[grouped_df["Control"]]
-    treated_data = grouped_df[~grouped_df["Control"]]
-    
-    # Plot Control Data (Left subplot)
-    ax1 = sns.barplot(ax=axes[0], data=control_data, x="Trip_Number", y=hormone, hue="Sample_Type", palette=color_palette)
-    axes[0].set_title(f"Control Samples - {hormone}", fontsize=14, fontweight='bold')
-    axes[0].set_xlabel("Trip Number (A=1, B=2, C=3, D=4)", fontsize=12)
-    axes[0].set_ylabel(f"{hormone} Concentration (ngH/g FW or DW)", fontsize=12)
-    
-    # Plot Hormone-Treated Data (Right subplot)
-    ax2 = sns.barplot(ax=axes[1], data=treated_data, x="Trip_Number", y=hormone, hue="Sample_Type", palette=color_palette)
-    axes[1].set_title(f"Hormone-Treated Samples - {hormone}", fontsize=14, fontweight='bold')
-    axes[1].set_xlabel("Trip Number (A=1, B=2, C=3, D=4)", fontsize=12)
-    
-   # Move legends inside their respective subplots
-    sns.move_legend(ax1, "lower center", bbox_to_anchor=(.5, -0.25), ncol=6, title="Sample Types", frameon=False)
-    sns.move_legend(ax2, "lower center", bbox_to_anchor=(.5, -0.25), ncol=6, title="Sample Types", frameon=False)
-
-    # Adjust layout to fit legends properly
-    plt.tight_layout()
-    plt.show()
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.dataset import load_dataset, get_hormone_columns
+from Main.Common.group_index import GroupIndex
+from Main.Common.rendering import add_worker_argument
+from Main.Common.plot_cache import render_changed_figures
+from Main.Common.instrumentation import add_trace_argument, enable_from_args
+from Main.Common.plot_templates import FigureTemplate, GroupedBars
+
+# Ensure output directory exists
+plot_dir = "Statistics/Plots/BarCharts"
+
+# Plot data, installed by set_plot_data() in every process that renders charts
+color_palette = None
+trips = None
+sample_types = None
+median_tables = None
+
+# Function to compute the medians the charts are drawn from
+def set_plot_data(df):
+    global color_palette, trips, sample_types, median_tables, bar_template
+
+    # The bars and legends of a template are built for the previous data, so it is rebuilt on first use
+    if bar_template is not None:
+        bar_template.close()
+        bar_template = None
+
+    # Set seaborn style
+    sns.set_style("whitegrid")
+
+    # Median hormone content of every (Sample_Type, Trip_Number, Control) group, read from slices of the group index
+    index = GroupIndex.from_dataset(df)
+    grouped_df = pd.concat([index.key_frame(), pd.DataFrame(index.medians(), columns=index.hormones)], axis=1)
+
+    # Define distinct colors for better clarity
+    color_palette = sns.color_palette("tab10", n_colors=len(grouped_df["Sample_Type"].unique()))
+
+    trips = sorted(grouped_df["Trip_Number"].unique())
+    sample_types = sorted(grouped_df["Sample_Type"].unique())
+
+    # Median per (Sample_Type, Trip_Number) for every hormone, one table per Control value
+    median_tables = {
+        control: grouped_df[grouped_df["Control"] == control].set_index(["Sample_Type", "Trip_Number"])
+        for control in [True, False]
+    }
+    os.makedirs(plot_dir, exist_ok=True)
+
+# Function to build the two-panel figure once: axes, bars, legends and styling
+def build_bar_template():
+    template = FigureTemplate(1, 2, figsize=(16, 6), sharey=True)  # Two subplots side by side
+    template.bars = {}
+    for ax, control in zip(template.axes, [True, False]):
+        template.bars[control] = GroupedBars(ax, trips, sample_types, color_palette)
+        ax.set_xlabel("Trip Number (A=1, B=2, C=3, D=4)", fontsize=12)
+
+        # Legends below their respective subplots
+        ax.legend(loc="lower center", bbox_to_anchor=(.5, -0.25), ncol=6, title="Sample Types", frameon=False)
+    template.freeze()
+    return template
+
+# Template reused by every chart rendered in this process
+bar_template = None
+
+# Function to create the bar charts of one hormone (runs in a worker process when saving)
+def render_bar_chart(hormone, show=False):
+    global bar_template
+    template = build_bar_template() if show or bar_template is None else bar_template
+    if not show:
+        bar_template = template
+    control_ax, treated_ax = template.axes
+
+    # Update only the bar heights and the shared y-limits
+    tops = []
+    for control, bars in template.bars.items():
+        heights = median_tables[control][hormone].reindex(
+            [(sample_type, trip) for sample_type in sample_types for trip in trips]
+        ).to_numpy().reshape(len(sample_types), len(trips))
+        bars.update(heights, scale_y=False)
+        tops.append(np.nanmax(heights) if np.isfinite(heights).any() else 0)
+    control_ax.set_ylim(0, max(tops) * 1.05 if max(tops) > 0 else 1)
+
+    control_ax.set_title(f"Control Samples - {hormone}", fontsize=14, fontweight='bold')
+    control_ax.set_ylabel(f"{hormone} Concentration (ngH/g FW or DW)", fontsize=12)
+    treated_ax.set_title(f"Hormone-Treated Samples - {hormone}", fontsize=14, fontweight='bold')
+
+    if show:
+        # Adjust layout to fit legends properly
+        plt.tight_layout()
+        plt.show()
+        template.close()
+    else:
+        template.save(plot_path(hormone), dpi=300)
+        print(f"Saved plot: {plot_path(hormone)}")
+
+# Function to name the PNG of one hormone
+def plot_path(hormone):
+    return os.path.join(plot_dir, f"{hormone}_Barchart.png")
+
+# Function to render the bar charts of every hormone whose data changed since the last run
+def render_bar_charts(df, workers=None, force=False):
+    keys = ["Sample_Type", "Trip_Number", "Control"]
+    return render_changed_figures(
+        render_bar_chart, get_hormone_columns(df), plot_path,
+        data_for=lambda hormone: df[keys + [hormone]],
+        params={"sample_types": sorted(df["Sample_Type"].unique()),
+                "trips": sorted(df["Trip_Number"].unique()), "dpi": 300},
+        force=force, workers=workers, setup=set_plot_data, setup_args=(df,),
+    )
+
+# Function to render the bar charts from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Bar charts of the median hormone content per trip and sample type")
+    parser.add_argument("--show", action="store_true", help="show each chart interactively instead of saving it")
+    parser.add_argument("--force", action="store_true", help="render every figure, even those whose inputs are unchanged")
+    add_worker_argument(parser)
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+
+    # Load cleaned dataset (typed: categorical Sample_Type/Trip_Number, boolean Control)
+    df = load_dataset()
+    hormone_columns = get_hormone_columns(df)
+
+    # Loop through each hormone and create separate subplots
+    if args.show:
+        set_plot_data(df)
+        for hormone in hormone_columns:
+            render_bar_chart(hormone, show=True)
+    else:
+        render_bar_charts(df, workers=args.workers, force=args.force)
+
+if __name__ == "__main__":
+    main()
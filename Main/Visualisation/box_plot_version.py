@@ -1,75 +1,84 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
-import numpy as np
+from matplotlib.patches import Patch
+import argparse
+import colorsys
 import os
+import sys
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.dataset import load_dataset, get_hormone_columns
+from Main.Common.group_index import GroupIndex, load_group_index
+from Main.Common.box_summary import box_summaries, box_summary_file
+from Main.Common.rendering import add_worker_argument
+from Main.Common.plot_cache import render_changed_figures
+from Main.Common.instrumentation import add_trace_argument, enable_from_args
+from Main.Common.plot_templates import FigureTemplate
+
+# Plot data, installed by set_plot_data() in every process that renders plots
+summaries = None
+color_palette = None
 
-# Load cleaned dataset
-df = pd.read_csv("Statistics/Cleaned_DatasetBio.csv", delimiter=";")
-
-# Ensure Trip_Number is treated as an integer
-df["Trip_Number"] = df["Trip_Number"].astype(int)
-
-# Extract Sample_Type from Sample_Name
-df["Sample_Type"] = df["Sample_Name"].str.extract(r'(\d{2,3})')[0]
-df = df.dropna(subset=["Sample_Type"])  # Remove NaN rows
-df["Sample_Type"] = df["Sample_Type"].astype(int)
+# Ensure output directory exists
+plot_dir = "Statistics/Plots/BoxPlots"
 
-# Identify control and hormone-treated samples
-df["Control"] = df["Sample_Name"].str.startswith("K")  # Control samples start with "K"
+# Boxes of one trip share this width, split between the sample types
+box_width = 0.5
 
-# Get hormone columns explicitly
-hormone_columns = df.select_dtypes(include=["float64", "int64"]).columns.tolist()
-hormone_columns = [col for col in hormone_columns if col not in ["Trip_Number", "Sample_Type"]]  # Exclude non-hormone columns
+# Function to install the box summaries the plots are drawn from
+def set_plot_data(data):
+    global summaries, color_palette, box_template
+    summaries = data
 
-# Set seaborn style
-sns.set_style("whitegrid")
+    # The legends of a template are built for the previous data, so it is rebuilt on first use
+    if box_template is not None:
+        box_template.close()
+        box_template = None
 
-# Define distinct colors for better clarity
-color_palette = sns.color_palette("tab10", n_colors=df["Sample_Type"].nunique())
+    # Set seaborn style
+    sns.set_style("whitegrid")
 
-# Function to group, describe, print stats, and plot data
-def print_boxplot_stats(data, hormone, label, ax):
-    # Group by Sample_Type and Trip_Number, storing all values in a sorted list
-    grouped_values = (
-        data.groupby(["Sample_Type", "Trip_Number"])[hormone]
-        .apply(lambda x: sorted(x.tolist()))  # Ensure sorting before visualization
-        .reset_index()
-    )
+    # Define distinct colors for better clarity
+    color_palette = sns.color_palette("tab10", n_colors=summaries.table["Sample_Type"].nunique())
+    os.makedirs(plot_dir, exist_ok=True)
 
-    # Compute descriptive statistics for each group
-    grouped_values["Min"] = grouped_values[hormone].apply(lambda x: min(x))
-    grouped_values["Median"] = grouped_values[hormone].apply(lambda x: np.median(x))
-    grouped_values["Q3"] = grouped_values[hormone].apply(lambda x: np.percentile(x, 75))
-    grouped_values["Max"] = grouped_values[hormone].apply(lambda x: max(x))
+# Function to print stats and draw the boxes of one side from the precomputed summaries
+def print_boxplot_stats(hormone, control, label, ax):
+    rows = summaries.rows(hormone, control)
 
     # Print descriptive statistics for terminal output
     print(f"\nDescriptive Statistics for {label} Samples - {hormone}:")
-    print(grouped_values[["Sample_Type", "Trip_Number", "Min", "Median", "Q3", "Max"]])
-
-    # Convert lists to separate rows for seaborn compatibility
-    grouped_values[hormone] = grouped_values[hormone].apply(lambda x: list(x) if isinstance(x, list) else [x])
-    exploded_data = grouped_values.explode(hormone, ignore_index=True)
-
-
-    # Create boxplot using correctly grouped values
-    sns.boxplot(ax=ax, data=exploded_data, x="Trip_Number", y=hormone, hue="Sample_Type",
-                palette=color_palette, fliersize=3, linewidth=1, width=0.5)
+    print(rows[["Sample_Type", "Trip_Number", "min", "median", "Q3", "max"]]
+          .rename(columns={"min": "Min", "median": "Median", "max": "Max"}).reset_index(drop=True))
+
+    # Same layout and styling as sns.boxplot(x="Trip_Number", hue="Sample_Type", width=0.5, linewidth=1, fliersize=3)
+    sample_types = list(rows["Sample_Type"].cat.categories)
+    trips = list(rows["Trip_Number"].cat.categories)
+    colors = [sns.desaturate(color, 0.75) for color in color_palette]
+    lum = min(colorsys.rgb_to_hls(*color)[1] for color in colors) * 0.6
+    line = {"color": (lum, lum, lum), "linewidth": 1}
+    width = box_width / len(sample_types)
+    for hue, (sample_type, color) in enumerate(zip(sample_types, colors)):
+        boxes = rows[rows["Sample_Type"] == sample_type]
+        if boxes.empty:
+            continue
+        positions = boxes["Trip_Number"].cat.codes.to_numpy() + width * hue + width / 2 - box_width / 2
+        ax.bxp(summaries.bxp_stats(boxes), positions=positions, widths=width, capwidths=0.5 * width,
+               patch_artist=True, manage_ticks=False,
+               boxprops={"facecolor": color, "edgecolor": line["color"], "linewidth": 1},
+               medianprops={**line, "solid_capstyle": "butt"}, whiskerprops={**line, "solid_capstyle": "butt"},
+               capprops=line, flierprops={"markeredgecolor": line["color"], "markersize": 3})
+    ax.set_xticks(range(len(trips)), [str(trip) for trip in trips])
+    ax.set_xlim(-0.5, len(trips) - 0.5)
+    ax.xaxis.grid(False)
 
     # Set subplot title
     ax.set_title(f"{label} Samples - {hormone}", fontsize=14, fontweight='bold')
     ax.set_xlabel("Trip Number", fontsize=12)
     ax.set_ylabel(f"{hormone} Concentration in DW", fontsize=12)
 
-    # Ensure legend is outside
-    ax.legend(title="Sample Types", loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=3)
-
     # Enable independent y-axis scaling
-    ax.set_ylim(exploded_data[hormone].min() * 0.9, exploded_data[hormone].max() * 1.1)
-
-# Ensure output directory exists
-plot_dir = "Statistics/Plots/BoxPlots"
-os.makedirs(plot_dir, exist_ok=True)
+    ax.set_ylim(rows["min"].min() * 0.9, rows["max"].max() * 1.1)
 
 # # Loop through each hormone and create separate subplots
 # for hormone in hormone_columns:
@@ -90,20 +99,76 @@ os.makedirs(plot_dir, exist_ok=True)
 """
 Quick autosave version
 """
-# Loop through each hormone and create separate subplots (saving version)
-for hormone in hormone_columns:
-    fig, axes = plt.subplots(1, 2, figsize=(16, 6), sharey=False)  # Two subplots, independent scales
-    
-    # Separate control and treated data
-    control_data = df[df["Control"]]
-    treated_data = df[~df["Control"]]
-
-    # Adjust layout
-    plt.tight_layout()
+# Function to build the two-panel figure once: legends and styling
+def build_box_template():
+    template = FigureTemplate(1, 2, figsize=(16, 6), sharey=False)  # Two subplots, independent scales
+    sample_types = sorted(summaries.table["Sample_Type"].unique())
+    handles = [Patch(facecolor=sns.desaturate(color, 0.75), edgecolor="0.3", label=str(sample_type))
+               for sample_type, color in zip(sample_types, color_palette)]
+    for ax in template.axes:
+        # Ensure legend is outside
+        ax.legend(handles=handles, title="Sample Types", loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=3)
+    template.freeze()
+    return template
+
+# Template reused by every plot rendered in this process
+box_template = None
+
+# Function to create and save the box plots of one hormone (runs in a worker process)
+def render_box_plot(hormone):
+    global box_template
+    if box_template is None:
+        box_template = build_box_template()
+    box_template.reset()  # Drop the boxes of the previous hormone
+
+    # Print stats and plot control and treated samples
+    print_boxplot_stats(hormone, True, "Control", box_template.axes[0])
+    print_boxplot_stats(hormone, False, "Hormone-Treated", box_template.axes[1])
 
     # Save the plot instead of showing it
-    plot_path = os.path.join(plot_dir, f"{hormone}_Boxplot.png")
-    plt.savefig(plot_path, dpi=300)
-    plt.close()
+    box_template.save(plot_path(hormone), dpi=300)
+
+    print(f"Saved plot: {plot_path(hormone)}")
+
+# Function to name the PNG of one hormone
+def plot_path(hormone):
+    return os.path.join(plot_dir, f"{hormone}_Boxplot.png")
+
+# Function to render the box plots of every hormone whose data changed since the last run
+def render_box_plots(df, workers=None, force=False, summaries=None):
+    """
+    Draws from the box summaries of df (computed here unless given); workers receive the
+    summaries, not the raw rows.
+    """
+    if summaries is None:
+        summaries = box_summaries(GroupIndex.from_dataset(df))
+    keys = ["Sample_Type", "Trip_Number", "Control"]
+    return render_changed_figures(
+        render_box_plot, get_hormone_columns(df), plot_path,
+        data_for=lambda hormone: df[keys + [hormone]],
+        params={"sample_types": sorted(df["Sample_Type"].unique()), "dpi": 300},
+        force=force, workers=workers, setup=set_plot_data, setup_args=(summaries,),
+    )
+
+# Function to render the box plots from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Box plots of every hormone, control vs. hormone-treated")
+    parser.add_argument("--force", action="store_true", help="render every figure, even those whose inputs are unchanged")
+    add_worker_argument(parser)
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+
+    # Load cleaned dataset (typed: categorical Sample_Type/Trip_Number, boolean Control)
+    df = load_dataset()
+
+    # Summarize every group once, for the plots and the exported table
+    summaries = box_summaries(load_group_index())
+    summaries.export_table().to_csv(box_summary_file, index=False)
+    print(f"Box plot summaries saved to {box_summary_file}")
+
+    # Loop through each hormone and create separate subplots (saving version)
+    render_box_plots(df, workers=args.workers, force=args.force, summaries=summaries)
 
-    print(f"Saved plot: {plot_path}")
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,163 @@
 import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
+import argparse
 import os
+import sys
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.rendering import add_worker_argument
+from Main.Common.plot_cache import render_changed_figures
+from Main.Common.instrumentation import span, add_trace_argument, enable_from_args
+from Main.Common.plot_templates import FigureTemplate, GroupedBars
+from Main.Common.results_store import ResultsStore, load_results_store
 
 # Load the dataset
 file_path = "Statistics/Non-Parameteric_Analysis_Results.csv"
-df = pd.read_csv(file_path)
-
-# Filter for Trip 1 to 4
-df = df[df["Trip"].between(1, 4)]
-
-# Ensure p-values are numeric (handle possible errors)
-df["p-value"] = pd.to_numeric(df["p-value"], errors="coerce")
 
 # Create output directory
 output_dir = "Statistics/Plots/p-ValuePlots"
-os.makedirs(output_dir, exist_ok=True)
 
-# Define a consistent color palette for Sample Types using "tab10"
-unique_sample_types = df["Sample Type"].unique()
-color_palette = sns.color_palette("tab10", n_colors=len(unique_sample_types))
+# Plot data, installed by set_plot_data() in every process that renders plots
+sample_type_colors = None
+trips = None
+sample_types = None
+p_value_table = None
+results_store = None
 
-# Map each Sample Type to a specific color
-sample_type_colors = {sample: color for sample, color in zip(unique_sample_types, color_palette)}
+# Inclusive (first, last) range of the trips that are plotted: every trip from 1 to 4 (A-D);
+# later trips, such as trip E = 5, are left out
+plotted_trips = (1, 4)
 
-# Iterate through unique hormones and generate plots
-for hormone in df["Hormone"].unique():
-    plt.figure(figsize=(8, 6))
+# Significance threshold, drawn as a line that every plot keeps in view
+significance_threshold = 0.05
 
-    # Filter data for the current hormone
-    hormone_df = df[df["Hormone"] == hormone]
+# Function to select the trips that are plotted
+def plotted_results(df):
+    # Filter for Trip 1 to 4
+    return df[df["Trip"].between(*plotted_trips)]
 
-    # Create barplot with consistent sample-type colors
-    ax = sns.barplot(
-        data=hormone_df,
-        x="Trip",
-        y="p-value",
-        hue="Sample Type",
-        palette=sample_type_colors  # Apply predefined color mapping
-    )
+# Function to compute the mean p-values the plots are drawn from
+def set_plot_data(results):
+    """
+    results is the results table, or a ResultsStore from which every plot reads the results
+    of its own hormone only.
+    """
+    global sample_type_colors, trips, sample_types, p_value_table, results_store, p_value_template
+
+    # The bars and legend of a template are built for the previous data, so it is rebuilt on first use
+    if p_value_template is not None:
+        p_value_template.close()
+        p_value_template = None
+
+    if isinstance(results, ResultsStore):
+        results_store, p_value_table = results, None
+        unique_sample_types = results_store.sample_types(plotted_trips)
+        trips = sorted(results_store.trips(plotted_trips))
+    else:
+        df = plotted_results(results).copy()
+
+        # Ensure p-values are numeric (handle possible errors, e.g. "N/A")
+        df["p-value"] = pd.to_numeric(df["p-value"], errors="coerce")
+        unique_sample_types = df["Sample Type"].unique()
+        trips = sorted(df["Trip"].unique())
+
+        # Mean p-value per (Hormone, Sample Type) and Trip, the value sns.barplot would draw
+        p_value_table = df.groupby(["Hormone", "Sample Type", "Trip"])["p-value"].mean().unstack("Trip").reindex(columns=trips)
+
+    # Define a consistent color palette for Sample Types using "tab10"
+    color_palette = sns.color_palette("tab10", n_colors=len(unique_sample_types))
+
+    # Map each Sample Type to a specific color
+    sample_type_colors = {sample: color for sample, color in zip(unique_sample_types, color_palette)}
+    sample_types = sorted(unique_sample_types)
+    os.makedirs(output_dir, exist_ok=True)
+
+# Function to get the mean p-value per sample type and trip of one hormone
+def mean_p_values(hormone):
+    if p_value_table is not None:
+        return p_value_table.loc[hormone]
+    df = results_store.results(hormone=hormone, trip_range=plotted_trips)
+    return df.groupby(["Sample Type", "Trip"])["p-value"].mean().unstack("Trip").reindex(columns=trips)
+
+# Function to build the figure once: bars, threshold line, labels and legend
+def build_p_value_template():
+    template = FigureTemplate(figsize=(8, 6))
+    ax = template.axes[0]
+    template.bars = GroupedBars(ax, trips, sample_types, [sample_type_colors[sample] for sample in sample_types])
 
     # Add significance threshold line (p = 0.05)
-    plt.axhline(y=0.05, color="red", linestyle="--", label="Significance Threshold (p=0.05)")
+    ax.axhline(y=significance_threshold, color="red", linestyle="--",
+               label=f"Significance Threshold (p={significance_threshold})")
+
+    # Labels and legend
+    ax.set_xlabel("Trip")
+    ax.set_ylabel("p-value")
+    ax.legend(title="Sample Type", bbox_to_anchor=(1.05, 1), loc="upper left")
+    template.freeze()
+    return template
+
+# Template reused by every plot rendered in this process
+p_value_template = None
 
-    # Labels and title
-    plt.xlabel("Trip")
-    plt.ylabel("p-value")
-    plt.title(f"P-values for {hormone}")
-    plt.legend(title="Sample Type", bbox_to_anchor=(1.05, 1), loc="upper left")
+# Function to create and save the p-value plot of one hormone (runs in a worker process)
+def render_p_value_plot(hormone):
+    global p_value_template
+    if p_value_template is None:
+        p_value_template = build_p_value_template()
+
+    # Update only the bar heights, limits and title for the current hormone
+    heights = mean_p_values(hormone).reindex(sample_types)
+    p_value_template.bars.update(heights.to_numpy(), floor=significance_threshold)
+    p_value_template.axes[0].set_title(f"P-values for {hormone}")
 
     # Save the figure
-    plot_path = os.path.join(output_dir, f"p_values_{hormone}.png")
-    plt.savefig(plot_path, bbox_inches="tight")
-    plt.close()  # Close to prevent overlapping figures
+    with span("savefig", category="figure"):
+        p_value_template.fig.savefig(plot_path(hormone), bbox_inches="tight")
+
+# Function to name the PNG of one hormone
+def plot_path(hormone):
+    return os.path.join(output_dir, f"p_values_{hormone}.png")
+
+# Function to render the p-value plots of every hormone whose results changed since the last run
+def render_p_value_plots(results, workers=None, force=False):
+    """
+    results is the results table or a ResultsStore (see set_plot_data).
+    """
+    # Key on the values that are drawn, the same whether the results come from memory, the CSV or the store
+    # (params hold plain Python values in both branches, so they hash the same)
+    key_columns = ["Hormone", "Sample Type", "Trip", "p-value"]
+    if isinstance(results, ResultsStore):
+        hormones = results.hormones(plotted_trips)
+        data_for = lambda hormone: results.results(hormone=hormone, trip_range=plotted_trips)[key_columns]
+        params = {"sample_types": sorted(results.sample_types(plotted_trips)), "trips": sorted(results.trips(plotted_trips))}
+    else:
+        df = plotted_results(results)[key_columns].copy()
+        df["p-value"] = pd.to_numeric(df["p-value"], errors="coerce")
+        slices = dict(tuple(df.groupby("Hormone", sort=False)))
+        hormones, data_for = df["Hormone"].unique(), slices.get
+        params = {"sample_types": sorted(df["Sample Type"].unique().tolist()), "trips": sorted(df["Trip"].unique().tolist())}
+    return render_changed_figures(
+        render_p_value_plot, hormones, plot_path, data_for=data_for, params=params,
+        force=force, workers=workers, setup=set_plot_data, setup_args=(results,),
+    )
+
+# Function to render the p-value plots from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="p-value bar plots of every hormone per trip and sample type")
+    parser.add_argument("--force", action="store_true", help="render every figure, even those whose inputs are unchanged")
+    add_worker_argument(parser)
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+
+    # Indexed store of the results, so every plot reads only its own hormone
+    results_store = load_results_store(results_file=file_path)
+
+    # Iterate through unique hormones and generate plots
+    render_p_value_plots(results_store, workers=args.workers, force=args.force)
+
+    print(f"Plots saved in {output_dir}")
 
-print(f"Plots saved in {output_dir}")
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,65 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import argparse
+import os
+import sys
 
-# Load the summarized statistical results
-summary_df = pd.read_csv("Statistics/Hormone_Analysis_Summary.csv")
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Main.Common.results_store import load_results_store
 
-def visualize_hormone_analysis(summary_df, method="heatmap"):
+plot_dir = "Statistics/Plots/SignificancePlots"
+
+# Matrices up to this many cells get an annotated cell grid, larger ones are drawn as one image
+annotate_max_cells = 600
+
+# Axes with more rows/columns than this only label an evenly spaced subset
+max_tick_labels = 40
+
+# Function to order rows by hierarchical clustering, similar rows next to each other
+def cluster_order(values):
+    """
+    Returns the leaf order of an average-linkage clustering of the rows of values, on
+    Euclidean distances (computed by scipy's vectorized pdist). Missing values count as 0.
+    """
+    from scipy.cluster.hierarchy import linkage, leaves_list  # Only needed for clustered heatmaps
+
+    if len(values) < 3:
+        return np.arange(len(values))
+    return leaves_list(linkage(np.nan_to_num(values), method="average", metric="euclidean"))
+
+# Function to draw a large matrix as a single raster image instead of one patch per cell
+def raster_heatmap(heatmap_data, ax):
+    image = ax.imshow(np.ma.masked_invalid(heatmap_data.to_numpy(dtype=float)), cmap="coolwarm",
+                      aspect="auto", interpolation="nearest")
+    plt.colorbar(image, ax=ax, label="Significance Ratio")
+
+    # Label every row/column of small axes, an evenly spaced subset of large ones
+    for set_ticks, labels in [(ax.set_xticks, heatmap_data.columns), (ax.set_yticks, heatmap_data.index)]:
+        positions = np.unique(np.linspace(0, len(labels) - 1, min(len(labels), max_tick_labels)).astype(int))
+        set_ticks(positions, [str(label) for label in labels[positions]])
+
+# Function to plot the significance ratios, saved and optionally shown
+def visualize_hormone_analysis(summary_df, method="heatmap", show=True, cluster=False):
+    """
+    cluster orders the heatmap's hormones and sample types by hierarchical clustering
+    instead of alphabetically.
+    """
+    os.makedirs(plot_dir, exist_ok=True)
     if method == "heatmap":
         # Prepare pivot table for heatmap
         heatmap_data = summary_df.pivot(index="Hormone", columns="Sample Type", values="Significance Ratio")
+        if cluster:
+            values = heatmap_data.to_numpy(dtype=float)
+            heatmap_data = heatmap_data.iloc[cluster_order(values), cluster_order(values.T)]
 
-        # Set figure size and create heatmap
+        # Set figure size and create heatmap (annotated only while the numbers stay readable)
         plt.figure(figsize=(12, 8))
-        sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".2f", linewidths=0.5, cbar_kws={"label": "Significance Ratio"})
+        if heatmap_data.size <= annotate_max_cells:
+            sns.heatmap(heatmap_data, cmap="coolwarm", annot=True, fmt=".2f", linewidths=0.5, cbar_kws={"label": "Significance Ratio"})
+        else:
+            raster_heatmap(heatmap_data, plt.gca())
 
         plt.xlabel("Sample Type")
         plt.ylabel("Hormone")
@@ -22,8 +68,8 @@ def visualize_hormone_analysis(summary_df, method="heatmap"):
         plt.yticks(rotation=0)
         
         plt.tight_layout()
-        plt.savefig("Statistics/Plots/SignificancePlots/Hormone_Analysis_Heatmap.png")
-        plt.show()
+        plt.savefig(os.path.join(plot_dir, "Hormone_Analysis_Heatmap.png"))
+        show_or_close(show)
 
     elif method == "bar":
         num_colors = summary_df["Hormone"].nunique()  # Get the number of unique hormones
@@ -59,9 +105,30 @@ def visualize_hormone_analysis(summary_df, method="heatmap"):
 
         plt.xticks(rotation=45)
         plt.tight_layout()
-        plt.savefig("Statistics/Plots/SignificancePlots/Hormone_Analysis_Barplot.png")
+        plt.savefig(os.path.join(plot_dir, "Hormone_Analysis_Barplot.png"))
+        show_or_close(show)
+
+# Function to show the current figure, or free it when running headless
+def show_or_close(show):
+    if show:
         plt.show()
+    else:
+        plt.close()
+
+# Function to draw the significance plots from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Significance ratio plots of every hormone and sample type")
+    parser.add_argument("--methods", nargs="+", choices=["heatmap", "bar"], default=["heatmap", "bar"])
+    parser.add_argument("--cluster", action="store_true", help="order the heatmap by hierarchical clustering")
+    parser.add_argument("--no-show", action="store_true", help="only save the plots")
+    args = parser.parse_args(argv)
+
+    # Load the summarized statistical results (from the indexed store, rebuilt if the CSVs changed)
+    summary_df = load_results_store().summary()
+
+    # Run visualization (choose method: "heatmap" or "bar")
+    for method in args.methods:
+        visualize_hormone_analysis(summary_df, method=method, show=not args.no_show, cluster=args.cluster)
 
-# Run visualization (choose method: "heatmap" or "bar")
-visualize_hormone_analysis(summary_df, method="heatmap")
-visualize_hormone_analysis(summary_df, method="bar")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Cleaning, statistical analysis and plotting of the hormone dataset.
+
+Run any step with python -m Main <command> (see python -m Main --help), or import the scripts
+as modules: importing has no side effects and heavy libraries are only imported by the steps
+that use them.
+"""
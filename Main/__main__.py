@@ -0,0 +1,46 @@
+"""
+Single command line for every step: python -m Main <command> [options].
+
+Only the module of the chosen command is imported, so e.g. the statistics never load
+matplotlib or seaborn. Options after the command are passed on to it (python -m Main stats --help).
+"""
+import argparse
+import os
+import sys
+
+# Make the package importable when this file is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Main.Common.scripts import load_script
+
+# Command -> (script below Main, description)
+commands = {
+    "clean": ("Cleaning.cleaning_main", "clean the raw instrument export"),
+    "analyze": ("Analysis.non-parametric-method", "Mann-Whitney U analysis and its summary"),
+    "stats": ("Analysis.standard-stats", "descriptive statistics"),
+    "box-plots": ("Visualisation.box_plot_version", "box plots of every hormone"),
+    "bar-charts": ("Visualisation.base_bar_chart", "median bar charts of every hormone"),
+    "p-value-plots": ("Visualisation.generate_p-value", "p-value bar plots of every hormone"),
+    "significance-plots": ("Visualisation.non-paremeteric-vis", "significance ratio heatmap and bar plot"),
+    "pipeline": ("pipeline", "run the stages in memory, skipping unchanged ones"),
+    "batch": ("batch", "clean and analyze many raw exports in parallel"),
+    "shards": ("shards", "run the analysis in shards from a work queue, and merge them"),
+    "generate-dataset": ("Benchmarks.generate_dataset", "write a synthetic dataset"),
+    "benchmark": ("Benchmarks.benchmark_suite", "time and memory-profile the stages"),
+}
+
+# Function to dispatch to the main() of the chosen command
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m Main", description="Hormone dataset cleaning, analysis and plotting",
+        epilog="commands:\n" + "\n".join(f"  {name:<20}{description}" for name, (_, description) in commands.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(commands), metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="options of the command")
+    args = parser.parse_args(argv)
+
+    script, _ = commands[args.command]
+    load_script(script).main(args.args, prog=f"python -m Main {args.command}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Batch mode: clean and analyze many raw exports in one run.
+
+Takes directories (every *.csv in them) and/or glob patterns of DatasetBio-style exports. Each
+dataset is cleaned, analyzed, summarized and described in its own worker process, and its
+outputs are written to <output>/<dataset>/ under the usual file names, together with the
+indexed results store of the dataset (analysis_results.sqlite). The results and
+summaries of all datasets are also combined into one table each, with a Dataset column.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# Make the package importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Main.Common.dataset import prepare_dataset
+from Main.Common.group_index import GroupIndex
+from Main.Common.results_store import save_results_store, results_store_file
+from Main.Common.scripts import load_script
+from Main.Common.instrumentation import span, call_collecting, merge, add_trace_argument, enable_from_args
+
+output_dir = "Statistics/Batch"
+
+# Function to expand directories and glob patterns into a sorted list of export files
+def find_exports(patterns):
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.csv")
+        paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+# Function to name every dataset after its file, adding the folder where names collide
+def dataset_keys(paths):
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    keys = {}
+    for path, stem in zip(paths, stems):
+        parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        keys[path] = stem if stems.count(stem) == 1 else f"{parent}_{stem}"
+    return keys
+
+# Function to process one export (runs in a worker process)
+def process_dataset(path, key, output_dir=output_dir):
+    """
+    Cleans, analyzes, summarizes and describes one export and writes its outputs to
+    output_dir/key/. Returns the results and summary tables with a Dataset column.
+    """
+    cleaning = load_script("Cleaning.cleaning_main")
+    analysis = load_script("Analysis.non-parametric-method")
+    standard_stats = load_script("Analysis.standard-stats")
+    dataset_dir = os.path.join(output_dir, key)
+    results_path = os.path.join(dataset_dir, "Non-Parameteric_Analysis_Results.csv")
+    summary_path = os.path.join(dataset_dir, "Hormone_Analysis_Summary.csv")
+
+    with span("dataset", category="batch", dataset=key), contextlib.redirect_stdout(io.StringIO()):
+        cleaned_df = cleaning.clean_in_memory(path)
+        os.makedirs(dataset_dir, exist_ok=True)
+        cleaned_df.to_csv(os.path.join(dataset_dir, "Cleaned_DatasetBio.csv"), index=False, sep=";")
+        df = prepare_dataset(cleaned_df)
+
+        index, ranked = GroupIndex.from_dataset(df), {}
+        results_df = analysis.run_analysis(df, index=index, ranked=ranked)
+        results_df.to_csv(results_path, index=False)
+        analysis.perform_kruskal_wallis(df, index=index, ranked=ranked).to_csv(
+            os.path.join(dataset_dir, "Kruskal_Wallis_Results.csv"), index=False)
+        summary_df = analysis.interpret_results(results_df)
+        summary_df.to_csv(summary_path, index=False)
+        save_results_store(results_df, summary_df, os.path.join(dataset_dir, os.path.basename(results_store_file)),
+                           sources={"results": results_path, "summary": summary_path})
+        standard_stats.compute_descriptive_stats(df, index=index).to_csv(os.path.join(dataset_dir, "Standard_statistics.csv"), index=True)
+
+    return results_df.assign(Dataset=key), summary_df.assign(Dataset=key)
+
+# Function to process every export in a process pool and combine the tables
+def run_batch(paths, output_dir=output_dir, workers=None):
+    """
+    Returns the combined results and summary tables (Dataset column first) and a dict
+    mapping each failed export to its error. A failing export does not stop the others.
+    """
+    keys = dataset_keys(paths)
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+    results, summaries, failures = {}, {}, {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(call_collecting, process_dataset, path, keys[path], output_dir): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                (results_df, summary_df), events = future.result()
+            except Exception as error:
+                failures[path] = f"{error!r}\n{''.join(traceback.format_exception(error))}"
+                print(f"Failed to process {path}: {failures[path]}")
+                continue
+            merge(events)
+            results[path], summaries[path] = results_df, summary_df
+            print(f"Processed {path} -> {os.path.join(output_dir, keys[path])}")
+
+    # Combined tables in the (sorted) order of the inputs, not of completion
+    def combine(tables):
+        done = [tables[path] for path in paths if path in tables]
+        if not done:
+            return pd.DataFrame(columns=["Dataset"])
+        combined = pd.concat(done, ignore_index=True)
+        return combined[["Dataset"] + [col for col in combined.columns if col != "Dataset"]]
+
+    return combine(results), combine(summaries), failures
+
+# Function to run the batch from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Clean and analyze many raw exports in parallel")
+    parser.add_argument("inputs", nargs="+", help="directories of raw exports (*.csv) or glob patterns")
+    parser.add_argument("--output", default=output_dir, help=f"output directory (default: {output_dir})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+
+    paths = find_exports(args.inputs)
+    if not paths:
+        parser.error("no raw exports found")
+    print(f"Processing {len(paths)} datasets")
+
+    results_df, summary_df, failures = run_batch(paths, args.output, args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    results_df.to_csv(os.path.join(args.output, "Combined_Analysis_Results.csv"), index=False)
+    summary_df.to_csv(os.path.join(args.output, "Combined_Analysis_Summary.csv"), index=False)
+    print(f"Processed {len(paths) - len(failures)} of {len(paths)} datasets, combined tables in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+In-memory pipeline: clean -> analyze -> summarize -> plot.
+
+The stages form a small dependency graph and hand their DataFrames to each other in memory,
+so the cleaned dataset and the results tables are never parsed back from CSV between stages.
+The CSV files are still written, as exports, by a background thread while the next stage runs.
+
+Every stage has a key: a hash of its own script and the Main modules it imports, plus the keys
+of the stages it depends on (the cleaning stage hashes the raw export instead). A stage whose key matches the previous run and
+whose outputs still exist is skipped; its result is read back from its export only if a later
+stage needs it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# Make the shared Main.Common helpers importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Main.Common.dataset import load_dataset, prepare_dataset, file_hash, cleaned_csv
+from Main.Common.group_index import GroupIndex
+from Main.Common.box_summary import box_summaries, box_summary_file
+from Main.Common.results_store import save_results_store, results_store_file
+from Main.Common.scripts import load_script, script_path, code_hash
+from Main.Common.rendering import add_worker_argument
+from Main.Common.instrumentation import span, add_trace_argument, enable_from_args
+
+raw_file = "Statistics/DatasetBio.csv"
+results_file = "Statistics/Non-Parameteric_Analysis_Results.csv"
+kruskal_file = "Statistics/Kruskal_Wallis_Results.csv"
+summary_file = "Statistics/Hormone_Analysis_Summary.csv"
+stats_file = "Statistics/Standard_statistics.csv"
+manifest_file = "Statistics/Cache/pipeline_manifest.json"
+
+class Stage:
+    """
+    One step of the pipeline. run(*inputs, export) computes the stage from the outputs of
+    the stages in depends_on and may return a value for later stages; load() reads that
+    value back from the exports when the stage was skipped. outputs are the files the stage
+    produces (a directory counts if it is not empty).
+    """
+
+    def __init__(self, name, module, depends_on, run, outputs, load=None):
+        self.name = name
+        self.module = module
+        self.depends_on = depends_on
+        self.run = run
+        self.outputs = outputs
+        self.load = load
+
+    def outputs_exist(self):
+        return all(os.path.isfile(path) or (os.path.isdir(path) and os.listdir(path)) for path in self.outputs)
+
+# Stage functions; export(df, path, **to_csv_kwargs) writes a CSV in the background
+def run_clean(export):
+    cleaned_df = load_script("Cleaning.cleaning_main").clean_in_memory(raw_file)
+    export(cleaned_df, cleaned_csv, index=False, sep=";")
+    return prepare_dataset(cleaned_df)
+
+def run_analyze(df, export):
+    analysis = load_script("Analysis.non-parametric-method")
+    index, ranked = GroupIndex.from_dataset(df), {}
+    results_df = analysis.run_analysis(df, index=index, ranked=ranked)
+    export(results_df, results_file, index=False)
+    export(analysis.perform_kruskal_wallis(df, index=index, ranked=ranked), kruskal_file, index=False)
+    return results_df
+
+def run_summarize(results_df, export):
+    summary_df = load_script("Analysis.non-parametric-method").interpret_results(results_df)
+    export(summary_df, summary_file, index=False)
+    return summary_df
+
+# The box summaries feed both the descriptive statistics and the box plots
+def run_stats(df, export):
+    index = GroupIndex.from_dataset(df)
+    summaries = box_summaries(index)
+    stats_df = load_script("Analysis.standard-stats").compute_descriptive_stats(df, index=index, summaries=summaries)
+    export(stats_df, stats_file, index=True)
+    export(summaries.export_table(), box_summary_file, index=False)
+    return summaries
+
+# Plot stages only render the figures whose data changed (see Main/Common/plot_cache.py)
+def run_box_plots(df, summaries, export, workers=None, force=False):
+    load_script("Visualisation.box_plot_version").render_box_plots(df, workers=workers, force=force, summaries=summaries)
+
+def run_bar_charts(df, export, workers=None, force=False):
+    load_script("Visualisation.base_bar_chart").render_bar_charts(df, workers=workers, force=force)
+
+def run_p_value_plots(results_df, export, workers=None, force=False):
+    load_script("Visualisation.generate_p-value").render_p_value_plots(results_df, workers=workers, force=force)
+
+def run_significance_plots(summary_df, export):
+    module = load_script("Visualisation.non-paremeteric-vis")
+    for method in ["heatmap", "bar"]:
+        module.visualize_hormone_analysis(summary_df, method=method, show=False)
+
+# The dependency graph, listed in an order where every stage follows its inputs
+stages = [
+    Stage("clean", "Cleaning.cleaning_main", [], run_clean, [cleaned_csv], load=load_dataset),
+    Stage("analyze", "Analysis.non-parametric-method", ["clean"], run_analyze, [results_file, kruskal_file],
+          load=lambda: pd.read_csv(results_file)),
+    Stage("summarize", "Analysis.non-parametric-method", ["analyze"], run_summarize, [summary_file, results_store_file],
+          load=lambda: pd.read_csv(summary_file)),
+    Stage("stats", "Analysis.standard-stats", ["clean"], run_stats, [stats_file, box_summary_file],
+          load=lambda: box_summaries(GroupIndex.from_dataset(load_dataset()))),
+    Stage("box_plots", "Visualisation.box_plot_version", ["clean", "stats"], run_box_plots, ["Statistics/Plots/BoxPlots"]),
+    Stage("bar_charts", "Visualisation.base_bar_chart", ["clean"], run_bar_charts, ["Statistics/Plots/BarCharts"]),
+    Stage("p_value_plots", "Visualisation.generate_p-value", ["analyze"], run_p_value_plots,
+          ["Statistics/Plots/p-ValuePlots"]),
+    Stage("significance_plots", "Visualisation.non-paremeteric-vis", ["summarize"], run_significance_plots,
+          ["Statistics/Plots/SignificancePlots/Hormone_Analysis_Heatmap.png",
+           "Statistics/Plots/SignificancePlots/Hormone_Analysis_Barplot.png"]),
+]
+plot_stages = {"box_plots", "bar_charts", "p_value_plots"}
+
+# Function to write one CSV export (runs on the writer thread)
+def write_csv(df, path, **to_csv_kwargs):
+    with span("to_csv", category="export", path=path):
+        df.to_csv(path, **to_csv_kwargs)
+
+# Function to compute the key of every stage from its code and its inputs
+def stage_keys(stages):
+    keys = {}
+    for stage in stages:
+        digest = hashlib.sha256(stage.name.encode())
+        digest.update(code_hash(script_path(stage.module)).encode())
+        digest.update(file_hash(raw_file).encode() if not stage.depends_on else b"")
+        for dependency in stage.depends_on:
+            digest.update(keys[dependency].encode())
+        keys[stage.name] = digest.hexdigest()
+    return keys
+
+# Function to read the stage keys recorded by the previous run
+def load_manifest(path=manifest_file):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=manifest_file):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+# Function to run the selected stages (and whatever they depend on) in dependency order
+def run_pipeline(selected=None, force=False, workers=None):
+    """
+    Runs every stage in selected (default: all) plus the stages they depend on. Stages
+    whose key is unchanged since the last run are skipped unless force is set (which also
+    re-renders every figure of the plot stages).
+    Returns the names of the stages that ran.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    needed = set()
+    pending = list(selected or by_name)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(by_name[name].depends_on)
+
+    keys = stage_keys(stages)
+    manifest = load_manifest()
+    values = {}
+    ran = []
+
+    # Function to get a stage's output, from this run or read back from its exports
+    def output_of(name):
+        if name not in values:
+            values[name] = by_name[name].load()
+        return values[name]
+
+    with ThreadPoolExecutor(max_workers=2) as writer:
+        pending_exports = {}
+
+        # Function to write a CSV export without holding up the next stage
+        def export(df, path, **to_csv_kwargs):
+            pending_exports.setdefault(current, []).append(writer.submit(write_csv, df, path, **to_csv_kwargs))
+
+        for stage in stages:
+            if stage.name not in needed:
+                continue
+            if not force and manifest.get(stage.name) == keys[stage.name] and stage.outputs_exist():
+                print(f"Skipping {stage.name}: inputs unchanged")
+                continue
+
+            print(f"Running {stage.name}")
+            current = stage.name
+            inputs = [output_of(dependency) for dependency in stage.depends_on]
+            extra = {"workers": workers, "force": force} if stage.name in plot_stages else {}
+            with span(stage.name, category="stage"):
+                values[stage.name] = stage.run(*inputs, export=export, **extra)
+            ran.append(stage.name)
+
+        # A stage is recorded as done once its exports are on disk
+        for name in ran:
+            for future in pending_exports.get(name, []):
+                future.result()
+            manifest[name] = keys[name]
+
+        # Indexed copy of the results and summary, recording the hashes of their CSVs now on disk
+        if "summarize" in ran:
+            save_results_store(output_of("analyze"), values["summarize"],
+                               sources={"results": results_file, "summary": summary_file})
+
+    save_manifest(manifest)
+    return ran
+
+# Function to run the pipeline from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Run the cleaning, analysis and plotting stages in memory")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to run, with their inputs (default: all): {', '.join(stage.name for stage in stages)}")
+    parser.add_argument("--force", action="store_true", help="run the stages even if their inputs are unchanged")
+    add_worker_argument(parser)
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+    unknown = set(args.stages) - {stage.name for stage in stages}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    run_pipeline(args.stages or None, force=args.force, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Shard-and-merge execution of the Mann-Whitney analysis.
+
+The (hormone, sample type) grid of the analysis is split into N shards (see
+Main/Common/sharding.py), and every shard is tested on its own and written to the shard directory:
+- python -m Main analyze --shard I/N runs one given shard, e.g. as one task of an array job;
+- python -m Main shards work --shards N pulls shards from a work queue in the shard directory
+  until none is left; run it with several --workers and/or on several machines that share the
+  directory;
+- python -m Main shards merge checks that the shards form one complete run and writes the
+  results table and its summary, the same as a single python -m Main analyze run.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Make the package importable when the script is run directly
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Main.Common.dataset import load_dataset, file_hash, cleaned_csv
+from Main.Common.results_store import load_results_store
+from Main.Common.sharding import WorkQueue, read_description, read_shards, default_shard_dir
+from Main.Common.scripts import load_script
+from Main.Common.instrumentation import span, call_collecting, merge, add_trace_argument, enable_from_args
+
+results_file = "Statistics/Non-Parameteric_Analysis_Results.csv"
+summary_file = "Statistics/Hormone_Analysis_Summary.csv"
+
+# Function to work through the queue until every shard is done or claimed (runs in a worker process)
+def work(directory=default_shard_dir, stale_after=None):
+    """
+    Shards computed from another version of the dataset count as not done and are run again.
+    Returns the shards this process ran.
+    """
+    analysis = load_script("Analysis.non-parametric-method")
+    queue = WorkQueue.open(directory, stale_after=stale_after)
+    df, source_hash = load_dataset(), file_hash(cleaned_csv)
+
+    # Function to check whether a shard's results exist for the current dataset
+    def is_done(shard):
+        description = read_description(shard, queue.shards, directory)
+        return description is not None and description["source_sha256"] == source_hash
+
+    done = []
+    while (shard := queue.claim(is_done)) is not None:
+        try:
+            with span("shard", category="shards", shard=shard):
+                analysis.run_shard(df, shard, queue.shards, source_hash, directory)
+        finally:
+            queue.release(shard)
+        done.append(shard)
+    return done
+
+# Function to run queue workers in a process pool
+def run_workers(directory=default_shard_dir, shards=None, workers=None, stale_after=None):
+    # The first worker to start fixes the number of shards, before any claims are made
+    queue = WorkQueue.open(directory, shards, stale_after)
+    workers = min(workers or os.cpu_count() or 1, queue.shards)
+    if workers == 1:
+        return work(directory, stale_after)
+
+    done = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call_collecting, work, directory, stale_after) for _ in range(workers)]
+        for future in futures:
+            shards_done, events = future.result()
+            merge(events)
+            done.extend(shards_done)
+    return sorted(done)
+
+# Function to assemble the shards of a directory into the results and summary tables
+def merge_shards(directory=default_shard_dir):
+    """
+    Raises ValueError when the shards do not form one complete run (see read_shards) or
+    hold duplicate results.
+    """
+    analysis = load_script("Analysis.non-parametric-method")
+    tables, description = read_shards(directory, cell_columns=["Hormone", "Sample Type"])
+    grid = description["grid"]
+    results_df = analysis.order_results(pd.concat(tables, ignore_index=True), grid)
+
+    duplicated = results_df.duplicated(["Hormone", "Sample Type", "Trip"])
+    if duplicated.any():
+        raise ValueError(f"{duplicated.sum()} results appear in more than one shard")
+    expected = len(grid["cells"]) * len(grid["trips"])
+    if len(results_df) != expected:
+        raise ValueError(f"the shards hold {len(results_df)} results instead of {expected}")
+
+    if os.path.exists(cleaned_csv) and file_hash(cleaned_csv) != description["source_sha256"]:
+        print(f"Warning: the shards were computed from another version of {cleaned_csv}")
+    return results_df, analysis.interpret_results(results_df)
+
+# Function to work on or merge the shards from the command line
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Run the Mann-Whitney analysis in shards and merge them")
+    parser.add_argument("action", choices=["work", "merge"],
+                        help="work: run shards from the work queue until none is left; "
+                             "merge: check the shards and write the results and summary tables")
+    parser.add_argument("--dir", default=default_shard_dir, help=f"shard directory (default: {default_shard_dir})")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="number of shards, required by the worker that starts the queue")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes on this machine (default: number of CPUs)")
+    parser.add_argument("--stale-after", type=float, default=None, metavar="SECONDS",
+                        help="take over shards claimed longer ago than this (default: never)")
+    add_trace_argument(parser)
+    args = parser.parse_args(argv)
+    enable_from_args(args)
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+
+    try:
+        if args.action == "work":
+            done = run_workers(args.dir, args.shards, args.workers, args.stale_after)
+            print(f"Ran {len(done)} shards: {', '.join(map(str, done)) or 'none left'}")
+            return
+        results_df, summary_df = merge_shards(args.dir)
+    except ValueError as error:
+        parser.error(str(error))
+
+    results_df.to_csv(results_file, index=False)
+    summary_df.to_csv(summary_file, index=False)
+    # The merged tables are text; the indexed store is built from the typed CSVs
+    load_results_store(results_file=results_file, summary_file=summary_file).close()
+    print(f"Merged {len(results_df)} results into {results_file} and {summary_file}")
+
+if __name__ == "__main__":
+    main()